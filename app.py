@@ -1,19 +1,83 @@
-from flask import Flask, jsonify, request, render_template
+from flask import Flask, jsonify, request, render_template, Response, stream_with_context
 import sqlite3
 import json
 import time
+import threading
+import os
+import csv
+import io
+import zlib
+from datetime import datetime, timedelta
 from flask_cors import CORS  # <--- 1. 导入 CORS
 
+import similarity
+import subscriptions
+import query_profiler
+
 app = Flask(__name__)
 CORS(app)  # <--- 2. 启用 CORS，允许所有源 (用于开发)
+# 静态资源缓存 1 天；publish_static.py 发布的指纹资源由静态服务器设置永久缓存
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 24 * 60 * 60
+# SQL 查询分析 (环境变量 JLU_OA_QUERY_PROFILE=1 开启)，结果见 /api/debug/queries 与 slow_queries.log
+app.config['QUERY_PROFILE'] = query_profiler.PROFILE_ENABLED
 
 # --- 数据库配置 ---
 DATABASE_NAME = 'jlu_oa_announcements.db'
 TABLE_NAME = 'announcements'
+SNAPSHOT_DIR = 'snapshots'
+SNAPSHOT_POINTER_FILE = os.path.join(SNAPSHOT_DIR, 'CURRENT')
+META_TABLE_NAME = 'sync_meta'
+DELETED_TABLE_NAME = 'announcements_deleted'
+ROLLUP_TABLES = {
+    # group_by 参数 -> (汇总表, 分组列)
+    'unit': ('rollup_day_unit', 'unit'),
+    'tag_primary': ('rollup_day_tag', 'tag_primary'),
+}
+TREND_DEFAULT_DAYS = 90
+TREND_MAX_PERIODS = 400  # 单次请求最多返回的统计周期数 (每个序列都会按周期补 0)
+
+# --- 导出配置 ---
+EXPORT_BATCH_SIZE = 1000  # 每次从游标取出并编码的行数，决定导出时的内存占用上限
+EXPORT_CSV_FIELDS = ["id", "timestamp", "date", "title", "unit", "tag_primary", "tags_secondary", "link"]
+
+# --- 增量推送配置 ---
+SSE_POLL_INTERVAL = 1.0        # 后台线程检查数据代数的间隔 (秒)
+SSE_KEEPALIVE_INTERVAL = 15.0  # 无新数据时发送心跳注释的间隔 (秒)
+CHANGES_PAGE_SIZE = 500        # /changes 与 SSE 每页返回的变更条数 (新增/更新 + 删除)
+CHANGES_MAX_PAGE_SIZE = 5000
+
+# 当前生效的数据库文件，仅在 CURRENT 指针文件变化时重新解析
+_snapshot_state = {"pointer_mtime": None, "path": DATABASE_NAME}
+
+def current_database_path():
+    """
+    返回当前生效的数据库文件路径。
+    update_db.py --publish 会原子切换 snapshots/CURRENT，这里通过 mtime 察觉变化，
+    之后新打开的连接即指向新快照，进行中的请求继续读旧快照，无需停机。
+    """
+    try:
+        pointer_mtime = os.stat(SNAPSHOT_POINTER_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return DATABASE_NAME
+
+    if pointer_mtime != _snapshot_state["pointer_mtime"]:
+        with open(SNAPSHOT_POINTER_FILE, 'r', encoding='utf-8') as f:
+            snapshot_path = os.path.join(SNAPSHOT_DIR, f.read().strip())
+        # 指向的文件不存在时不记录 mtime，下次请求继续检查
+        if os.path.exists(snapshot_path):
+            print(f"🔀 检测到新快照，后续请求将使用 {snapshot_path}")
+            _snapshot_state["path"] = snapshot_path
+            _snapshot_state["pointer_mtime"] = pointer_mtime
+
+    return _snapshot_state["path"]
+
+def connection_factory():
+    """开启查询分析时返回带计时的连接类，否则返回普通连接类"""
+    return query_profiler.ProfiledConnection if app.config['QUERY_PROFILE'] else sqlite3.Connection
 
 def get_db_connection():
     """建立数据库连接，并设置行工厂为字典模式"""
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = sqlite3.connect(current_database_path(), factory=connection_factory())
     conn.row_factory = sqlite3.Row # 使得查询结果可以像字典一样访问
     return conn
 
@@ -24,6 +88,7 @@ def date_from_timestamp(timestamp):
 def serialize_announcement(row):
     """将数据库行对象序列化为前端需要的格式"""
     return {
+        "id": row['id'], # rowid，用于 /api/announcements/<id>/related
         "timestamp": row['timestamp'],
         "date": date_from_timestamp(row['timestamp']),
         "title": row['title'],
@@ -33,24 +98,172 @@ def serialize_announcement(row):
         "link": row['link']
     }
 
+def get_generation(conn):
+    """读取当前数据代数 (由 update_db.py 每次提交时递增)，旧数据库返回 0"""
+    try:
+        row = conn.execute(f"SELECT value FROM {META_TABLE_NAME} WHERE key = 'generation'").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] if row else 0
+
+def query_changes(conn, since, after=None, limit=CHANGES_PAGE_SIZE):
+    """
+    分页查询代数大于 since 的新增/更新公告以及被删除的链接。
+    新增/更新与删除合并为一个按 (代数, link) 升序的序列分页 (同一链接不会同时出现在两张表中)；
+    after 为上一页最后一条的 link，与 since 一起构成游标。
+    只返回不超过当前代数的变更，读完 (hasMore 为 false) 后下一次请求以返回的 since (即当前代数) 为起点。
+    """
+    generation = get_generation(conn)
+
+    if after is None:
+        cursor_sql = "gen > ?"
+        cursor_params = [since]
+    else:
+        cursor_sql = "(gen > ? OR (gen = ? AND link > ?))"
+        cursor_params = [since, since, after]
+
+    page_rows = conn.execute(f"""
+    SELECT gen, link, is_deleted FROM (
+        SELECT update_gen AS gen, link, 0 AS is_deleted FROM {TABLE_NAME}
+        UNION ALL
+        SELECT deleted_gen AS gen, link, 1 AS is_deleted FROM {DELETED_TABLE_NAME}
+    )
+    WHERE {cursor_sql} AND gen <= ?
+    ORDER BY gen, link LIMIT ?
+    """, [*cursor_params, generation, limit + 1]).fetchall()
+
+    has_more = len(page_rows) > limit
+    page_rows = page_rows[:limit]
+
+    changed_links = [row['link'] for row in page_rows if not row['is_deleted']]
+    changed_rows = []
+    if changed_links:
+        placeholders = ",".join("?" * len(changed_links))
+        changed_rows = conn.execute(
+            f"SELECT rowid AS id, * FROM {TABLE_NAME} WHERE link IN ({placeholders}) ORDER BY update_gen, timestamp DESC",
+            changed_links
+        ).fetchall()
+
+    if has_more:
+        next_since, next_after = page_rows[-1]['gen'], page_rows[-1]['link']
+    else:
+        next_since, next_after = max(generation, since), None
+
+    return {
+        # 下一次请求的游标
+        "since": next_since,
+        "after": next_after,
+        "hasMore": has_more,
+        "generation": generation,
+        "announcements": [serialize_announcement(row) for row in changed_rows],
+        "deleted": [row['link'] for row in page_rows if row['is_deleted']]
+    }
+
+class ChangeBroadcaster:
+    """
+    单个后台线程轮询数据代数，代数变化时唤醒所有 SSE 订阅者。
+    空闲订阅者只阻塞在条件变量上，不会各自查询数据库；
+    同一代数下相同 since 的增量结果只查询一次，供所有订阅者共享。
+    """
+
+    def __init__(self, poll_interval):
+        self.poll_interval = poll_interval
+        self._cond = threading.Condition()
+        self._generation = None
+        self._payload_cache = {}
+        self._thread = None
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="change-broadcaster", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                # 每秒一次的轮询不经过查询分析，避免汇总中充斥与请求无关的语句
+                conn = sqlite3.connect(current_database_path())
+                try:
+                    self.notify(get_generation(conn))
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                print(f"⚠️ 读取数据代数失败: {e}")
+            time.sleep(self.poll_interval)
+
+    def notify(self, generation):
+        """记录最新代数；代数前进时唤醒所有等待中的订阅者"""
+        with self._cond:
+            if generation != self._generation:
+                self._generation = generation
+                self._payload_cache = {}
+                self._cond.notify_all()
+
+    def current_generation(self):
+        with self._cond:
+            return self._generation
+
+    def wait_for_change(self, known_generation, timeout):
+        """阻塞直到代数超过 known_generation 或超时，返回当前代数 (可能为 None)"""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._generation is not None and self._generation > known_generation,
+                timeout
+            )
+            return self._generation
+
+    def get_changes(self, since, after=None):
+        """返回 (增量字典, 增量 JSON)，同一代数内按游标 (since, after) 缓存"""
+        with self._cond:
+            cached = self._payload_cache.get((since, after))
+        if cached is not None:
+            return cached
+
+        conn = get_db_connection()
+        try:
+            changes = query_changes(conn, since, after)
+        finally:
+            conn.close()
+        result = (changes, json.dumps(changes, ensure_ascii=False))
+
+        with self._cond:
+            if changes["generation"] == self._generation:
+                self._payload_cache[(since, after)] = result
+        return result
+
+broadcaster = ChangeBroadcaster(SSE_POLL_INTERVAL)
+
+# /api/filters 需要扫描全表，按数据代数缓存结果
+_filters_cache = {"generation": None, "data": None}
+
+def invalidate_caches(generation=None):
+    """
+    数据导入后调用：清空筛选条件缓存，并立即唤醒 SSE 订阅者。
+    同进程运行的调度守护进程 (daemon.py) 在每次导入后调用此函数，无需重启服务。
+    """
+    _filters_cache["generation"] = None
+    _filters_cache["data"] = None
+    if generation is not None:
+        broadcaster.notify(generation)
+
 # ====================================================================
 # I. /api/announcements 核心接口实现
 # ====================================================================
 
-@app.route('/api/announcements', methods=['GET'])
-def get_announcements():
-    # --- 1. 获取请求参数 ---
-    page = request.args.get('page', 1, type=int)
-    size = request.args.get('size', 20, type=int)
-    sort = request.args.get('sort', 'time_desc', type=str)
-    unit = request.args.get('unit', type=str)
-    tags = request.args.get('tags', type=str)
-    keyword = request.args.get('keyword', type=str)
-
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def build_announcement_query(args):
+    """
+    根据请求参数构建 WHERE/ORDER BY 子句与参数，/api/announcements 与 /api/export 共用。
+    支持 keyword、unit、tags、sort、collapse。
+    """
+    sort = args.get('sort', 'time_desc', type=str)
+    unit = args.get('unit', type=str)
+    tags = args.get('tags', type=str)
+    keyword = args.get('keyword', type=str)
+    collapse = args.get('collapse', 0, type=int) # 1: 折叠近重复公告，只保留每组中最新的一条
 
-    # --- 2. 构建 WHERE 查询条件和参数 ---
+    # --- 1. 构建 WHERE 查询条件和参数 ---
     where_clauses = []
     params = []
 
@@ -59,6 +272,10 @@ def get_announcements():
         where_clauses.append("(title LIKE ? OR unit LIKE ?)")
         params.extend([f"%{keyword}%", f"%{keyword}%"])
 
+    # 折叠重复发布的公告 (dup_of 由 update_db.py 导入时计算)
+    if collapse:
+        where_clauses.append("dup_of IS NULL")
+
     # 单位筛选
     if unit:
         where_clauses.append("unit = ?")
@@ -80,28 +297,42 @@ def get_announcements():
     if where_sql:
         where_sql = " WHERE " + where_sql
 
-    # --- 3. 排序逻辑 ---
+    # --- 2. 排序逻辑 ---
     order_sql = "ORDER BY timestamp DESC"
     if sort == 'time_asc':
         order_sql = "ORDER BY timestamp ASC"
 
-    # --- 4. 分页逻辑 ---
+    return where_sql, params, order_sql
+
+@app.route('/api/announcements', methods=['GET'])
+def get_announcements():
+    # --- 1. 获取请求参数 ---
+    page = request.args.get('page', 1, type=int)
+    size = request.args.get('size', 20, type=int)
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    # --- 2. 构建查询条件与排序 ---
+    where_sql, params, order_sql = build_announcement_query(request.args)
+
+    # --- 3. 分页逻辑 ---
     offset = (page - 1) * size
     limit_sql = f"LIMIT {size} OFFSET {offset}"
 
-    # --- 5. 执行查询 ---
+    # --- 4. 执行查询 ---
     # a. 查询总数
     count_query = f"SELECT COUNT(*) FROM {TABLE_NAME} {where_sql}"
     cursor.execute(count_query, params)
     total_items = cursor.fetchone()[0]
 
     # b. 查询当前页数据
-    data_query = f"SELECT * FROM {TABLE_NAME} {where_sql} {order_sql} {limit_sql}"
+    data_query = f"SELECT rowid AS id, * FROM {TABLE_NAME} {where_sql} {order_sql} {limit_sql}"
     announcements_rows = cursor.execute(data_query, params).fetchall()
 
     conn.close()
 
-    # --- 6. 整理和返回结果 ---
+    # --- 5. 整理和返回结果 ---
     announcements_list = [serialize_announcement(row) for row in announcements_rows]
     total_pages = (total_items + size - 1) // size
 
@@ -117,6 +348,69 @@ def get_announcements():
         }
     })
 
+# ====================================================================
+# I-b. /api/export 流式导出
+# ====================================================================
+
+def encode_ndjson_rows(rows):
+    return "".join(json.dumps(serialize_announcement(row), ensure_ascii=False) + "\n" for row in rows).encode('utf-8')
+
+def encode_csv_rows(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        item = serialize_announcement(row)
+        item["tags_secondary"] = "|".join(item["tags_secondary"])
+        writer.writerow([item[field] for field in EXPORT_CSV_FIELDS])
+    return buffer.getvalue().encode('utf-8')
+
+def gzip_stream(chunks):
+    """逐块 gzip 压缩；每块后 Z_SYNC_FLUSH，保证客户端能立即收到已编码的数据"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) # wbits=31 生成 gzip 格式
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+@app.route('/api/export', methods=['GET'])
+def export_announcements():
+    # 筛选参数与 /api/announcements 相同，额外支持 format=ndjson|csv 与 gzip=1
+    export_format = request.args.get('format', 'ndjson', type=str)
+    use_gzip = request.args.get('gzip', 0, type=int)
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({"code": 400, "message": "format 只支持 ndjson 或 csv", "data": None}), 400
+
+    where_sql, params, order_sql = build_announcement_query(request.args)
+    data_query = f"SELECT rowid AS id, * FROM {TABLE_NAME} {where_sql} {order_sql}"
+    encode_rows = encode_ndjson_rows if export_format == 'ndjson' else encode_csv_rows
+
+    def generate():
+        # 直接迭代 SQLite 游标，每次只持有 EXPORT_BATCH_SIZE 行，内存占用与总行数无关
+        conn = get_db_connection()
+        try:
+            cursor = conn.execute(data_query, params)
+            if export_format == 'csv':
+                yield ("\ufeff" + ",".join(EXPORT_CSV_FIELDS) + "\r\n").encode('utf-8') # BOM 便于 Excel 识别 UTF-8
+            while True:
+                rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                yield encode_rows(rows)
+        finally:
+            conn.close()
+
+    filename = f"jlu_oa_announcements.{export_format}"
+    mimetype = 'application/x-ndjson' if export_format == 'ndjson' else 'text/csv'
+    body = generate()
+    if use_gzip:
+        filename += ".gz"
+        mimetype = 'application/gzip'
+        body = gzip_stream(body)
+
+    return Response(stream_with_context(body), mimetype=mimetype, headers={
+        "Content-Disposition": f"attachment; filename={filename}",
+        "X-Accel-Buffering": "no"
+    })
+
 # ====================================================================
 # II. /api/filters 筛选条件接口实现
 # ====================================================================
@@ -126,6 +420,16 @@ def get_filters():
     conn = get_db_connection()
     cursor = conn.cursor()
 
+    # 0. 数据代数未变化时直接返回缓存
+    generation = get_generation(conn)
+    if _filters_cache["data"] is not None and _filters_cache["generation"] == generation:
+        conn.close()
+        return jsonify({
+            "code": 200,
+            "message": "Success",
+            "data": _filters_cache["data"]
+        })
+
     # 1. 统计发布单位 (Unit)
     # 按照单位分组，并计算每个单位的公告数量
     units_query = f"SELECT unit, COUNT(unit) as count FROM {TABLE_NAME} GROUP BY unit ORDER BY count DESC"
@@ -158,20 +462,399 @@ def get_filters():
 
     conn.close()
 
+    filters_data = {
+        "units": units_list,
+        "tags_primary": tags_primary_list,
+        "tags_secondary_all": tags_secondary_top # 返回全部，前端决定如何显示 Top N
+    }
+    _filters_cache["generation"] = generation
+    _filters_cache["data"] = filters_data
+
+    return jsonify({
+        "code": 200,
+        "message": "Success",
+        "data": filters_data
+    })
+
+@app.route('/api/announcements/<int:announcement_id>/related', methods=['GET'])
+def get_related_announcements(announcement_id):
+    limit = request.args.get('limit', 10, type=int)
+    threshold = request.args.get('threshold', similarity.RELATED_THRESHOLD, type=float)
+    # LSH 索引对更低相似度的召回率不足，拒绝而不是悄悄返回不完整的结果
+    if not similarity.RELATED_MIN_THRESHOLD <= threshold <= 1:
+        return jsonify({
+            "code": 400,
+            "message": f"threshold 应在 {similarity.RELATED_MIN_THRESHOLD}-1 之间",
+            "data": None
+        }), 400
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    row = cursor.execute(f"SELECT link FROM {TABLE_NAME} WHERE rowid = ?", (announcement_id,)).fetchone()
+    if not row:
+        conn.close()
+        return jsonify({"code": 404, "message": "Announcement not found", "data": None}), 404
+
+    # 通过 LSH 分桶查找相似标题，只比较同桶候选
+    signature = similarity.get_signature(cursor, row['link'])
+    matches = similarity.find_similar(cursor, signature, threshold, limit, exclude_link=row['link']) if signature else []
+
+    related_list = []
+    for link, score in matches:
+        related_row = cursor.execute(f"SELECT rowid AS id, * FROM {TABLE_NAME} WHERE link = ?", (link,)).fetchone()
+        if related_row:
+            item = serialize_announcement(related_row)
+            item["similarity"] = score
+            item["duplicate"] = score >= similarity.DUPLICATE_THRESHOLD
+            related_list.append(item)
+
+    conn.close()
+
     return jsonify({
         "code": 200,
         "message": "Success",
         "data": {
-            "units": units_list,
-            "tags_primary": tags_primary_list,
-            "tags_secondary_all": tags_secondary_top # 返回全部，前端决定如何显示 Top N
+            "id": announcement_id,
+            "related": related_list
         }
     })
 
+# ====================================================================
+# III. /api/announcements/changes 增量同步与 SSE 推送
+# ====================================================================
+
+@app.route('/api/announcements/changes', methods=['GET'])
+def get_announcement_changes():
+    # since 为客户端上次同步得到的 generation，0 表示全量；
+    # hasMore 为 true 时带上返回的 since/after 继续读取，读完后保存返回的 since 供下次同步
+    since = request.args.get('since', 0, type=int)
+    after = request.args.get('after', type=str)
+    limit = request.args.get('limit', CHANGES_PAGE_SIZE, type=int)
+    if not 0 < limit <= CHANGES_MAX_PAGE_SIZE:
+        return jsonify({"code": 400, "message": f"limit 应在 1-{CHANGES_MAX_PAGE_SIZE} 之间", "data": None}), 400
+
+    conn = get_db_connection()
+    changes = query_changes(conn, since, after, limit)
+    conn.close()
+
+    return jsonify({
+        "code": 200,
+        "message": "Success",
+        "data": changes
+    })
+
+@app.route('/api/announcements/stream', methods=['GET'])
+def stream_announcements():
+    # 断线重连时浏览器会通过 Last-Event-ID 带回上次收到的代数
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    since = request.args.get('since', type=int)
+    if last_event_id is not None:
+        since = last_event_id
+
+    broadcaster.start()
+    if since is None:
+        # 未指定起点时只推送连接之后的新数据
+        conn = get_db_connection()
+        since = get_generation(conn)
+        conn.close()
+
+    def event_stream(last_generation):
+        yield f"retry: 5000\nid: {last_generation}\n\n"
+        while True:
+            generation = broadcaster.wait_for_change(last_generation, SSE_KEEPALIVE_INTERVAL)
+            if generation is None or generation <= last_generation:
+                yield ": keepalive\n\n"
+                continue
+
+            # 积压较多时分页推送；只有最后一页带 id，断线重连后从上一个完整代数重新开始
+            cursor_since, cursor_after = last_generation, None
+            while True:
+                changes, payload = broadcaster.get_changes(cursor_since, cursor_after)
+                if changes["generation"] <= last_generation:
+                    # 广播线程记录的代数领先于数据库 (如导入方通知有误)，等下一次轮询校正，不发送空事件
+                    yield ": keepalive\n\n"
+                    time.sleep(broadcaster.poll_interval)
+                    break
+                if changes["hasMore"]:
+                    yield f"event: announcements\ndata: {payload}\n\n"
+                    cursor_since, cursor_after = changes["since"], changes["after"]
+                    continue
+                yield f"id: {changes['generation']}\nevent: announcements\ndata: {payload}\n\n"
+                last_generation = changes["generation"]
+                break
+
+    return Response(event_stream(since), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"  # 禁止反向代理缓冲，保证事件即时送达
+    })
+
+# ====================================================================
+# IV. /api/stats/trends 按日/周/月统计趋势
+# ====================================================================
+
+def period_start(day, granularity):
+    """返回日期所在统计周期的起始日 (周以周一为起点)"""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+def next_period(day, granularity):
+    """返回下一个统计周期的起始日"""
+    if granularity == 'week':
+        return day + timedelta(days=7)
+    if granularity == 'month':
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+def period_count(start, end, granularity):
+    """返回 [start, end] 覆盖的统计周期数，无需逐个生成"""
+    if granularity == 'week':
+        return (end - period_start(start, granularity)).days // 7 + 1
+    if granularity == 'month':
+        return (end.year - start.year) * 12 + end.month - start.month + 1
+    return (end - start).days + 1
+
+@app.route('/api/stats/trends', methods=['GET'])
+def get_trends():
+    # --- 1. 获取请求参数 ---
+    granularity = request.args.get('granularity', 'day', type=str)
+    group_by = request.args.get('group_by', 'unit', type=str)
+    name = request.args.get('name', type=str) # 只统计某个单位/一级TAG
+    top = request.args.get('top', 10, type=int)
+    try:
+        end = datetime.strptime(request.args.get('end', date_from_timestamp(time.time())), "%Y-%m-%d")
+        start = request.args.get('start', type=str)
+        start = datetime.strptime(start, "%Y-%m-%d") if start else end - timedelta(days=TREND_DEFAULT_DAYS - 1)
+    except ValueError:
+        return jsonify({"code": 400, "message": "start/end 格式应为 YYYY-MM-DD", "data": None}), 400
+
+    if granularity not in ('day', 'week', 'month') or group_by not in ROLLUP_TABLES or start > end:
+        return jsonify({"code": 400, "message": "Invalid parameters", "data": None}), 400
+
+    if period_count(start, end, granularity) > TREND_MAX_PERIODS:
+        return jsonify({
+            "code": 400,
+            "message": f"时间范围过大：最多 {TREND_MAX_PERIODS} 个统计周期，请缩小 start/end 或使用更粗的 granularity",
+            "data": None
+        }), 400
+
+    # --- 2. 从按日汇总表读取 (汇总表由 update_db.py 增量维护) ---
+    rollup_table, column = ROLLUP_TABLES[group_by]
+    where_sql = "WHERE day >= ? AND day <= ?"
+    params = [start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")]
+    if name:
+        where_sql += f" AND {column} = ?"
+        params.append(name)
+
+    conn = get_db_connection()
+    rows = conn.execute(f"SELECT day, {column} AS name, count FROM {rollup_table} {where_sql}", params).fetchall()
+    conn.close()
+
+    # --- 3. 按周期聚合，并为没有公告的周期补 0 ---
+    periods = []
+    day = period_start(start, granularity)
+    while day <= end:
+        periods.append(day.strftime("%Y-%m-%d"))
+        day = next_period(day, granularity)
+    period_index = {period: i for i, period in enumerate(periods)}
+
+    series = {}
+    for row in rows:
+        period = period_start(datetime.strptime(row['day'], "%Y-%m-%d"), granularity).strftime("%Y-%m-%d")
+        counts = series.setdefault(row['name'], [0] * len(periods))
+        counts[period_index[period]] += row['count']
+
+    series_list = sorted(
+        ({"name": key, "total": sum(counts), "counts": counts} for key, counts in series.items()),
+        key=lambda item: item["total"], reverse=True
+    )
+
+    return jsonify({
+        "code": 200,
+        "message": "Success",
+        "data": {
+            "granularity": granularity,
+            "groupBy": group_by,
+            "start": params[0],
+            "end": params[1],
+            "periods": periods,
+            "series": series_list[:top] if top > 0 else series_list
+        }
+    })
+
+# ====================================================================
+# V. /api/subscriptions 订阅 (导入时由 update_db.py 通过反向索引匹配)
+# ====================================================================
+
+@app.route('/api/subscriptions', methods=['GET'])
+def list_subscriptions():
+    sub_conn = subscriptions.get_subscription_connection(factory=connection_factory())
+    rows = sub_conn.execute(f"SELECT * FROM {subscriptions.SUBSCRIPTION_TABLE_NAME} ORDER BY id").fetchall()
+    sub_conn.close()
+
+    return jsonify({
+        "code": 200,
+        "message": "Success",
+        "data": [subscriptions.serialize_subscription(row) for row in rows]
+    })
+
+@app.route('/api/subscriptions', methods=['POST'])
+def create_subscription():
+    # 请求体: {"name": ..., "unit": ..., "tags": ["TAG1", "TAG2"] 或 "TAG1,TAG2", "keyword": ...}
+    # unit、tags、keyword 至少提供一个，否则订阅会匹配全部公告
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"code": 400, "message": "请求体应为 JSON 对象", "data": None}), 400
+
+    sub_conn = subscriptions.get_subscription_connection(factory=connection_factory())
+    try:
+        subscription_id = subscriptions.create_subscription(
+            sub_conn,
+            name=body.get('name'),
+            unit=body.get('unit'),
+            tags=body.get('tags'),
+            keyword=body.get('keyword')
+        )
+    except ValueError as e:
+        sub_conn.close()
+        return jsonify({"code": 400, "message": str(e), "data": None}), 400
+    row = sub_conn.execute(
+        f"SELECT * FROM {subscriptions.SUBSCRIPTION_TABLE_NAME} WHERE id = ?", (subscription_id,)
+    ).fetchone()
+    sub_conn.close()
+
+    return jsonify({
+        "code": 201,
+        "message": "Created",
+        "data": subscriptions.serialize_subscription(row)
+    }), 201
+
+@app.route('/api/subscriptions/<int:subscription_id>', methods=['DELETE'])
+def delete_subscription(subscription_id):
+    sub_conn = subscriptions.get_subscription_connection(factory=connection_factory())
+    deleted = subscriptions.delete_subscription(sub_conn, subscription_id)
+    sub_conn.close()
+
+    if not deleted:
+        return jsonify({"code": 404, "message": "Subscription not found", "data": None}), 404
+    return jsonify({"code": 200, "message": "Success", "data": None})
+
+@app.route('/api/subscriptions/<int:subscription_id>/matches', methods=['GET'])
+def get_subscription_matches(subscription_id):
+    # 按 (generation, link) 升序分页的游标：since 为上次返回的 generation，after 为上次返回的 after。
+    # 只带 since 时返回该代数之后的匹配；hasMore 为 true 时应带上返回的 since/after 继续读取。
+    since = request.args.get('since', 0, type=int)
+    after = request.args.get('after', type=str)
+    size = request.args.get('size', 50, type=int)
+    if size <= 0:
+        return jsonify({"code": 400, "message": "size 应为正整数", "data": None}), 400
+
+    if after is None:
+        cursor_sql = "generation > ?"
+        cursor_params = [since]
+    else:
+        cursor_sql = "(generation > ? OR (generation = ? AND link > ?))"
+        cursor_params = [since, since, after]
+
+    sub_conn = subscriptions.get_subscription_connection(factory=connection_factory())
+    exists = sub_conn.execute(
+        f"SELECT 1 FROM {subscriptions.SUBSCRIPTION_TABLE_NAME} WHERE id = ?", (subscription_id,)
+    ).fetchone()
+    match_rows = sub_conn.execute(f"""
+    SELECT link, generation FROM {subscriptions.MATCH_TABLE_NAME}
+    WHERE subscription_id = ? AND {cursor_sql}
+    ORDER BY generation, link LIMIT ?
+    """, [subscription_id, *cursor_params, size + 1]).fetchall()
+    sub_conn.close()
+
+    has_more = len(match_rows) > size
+    match_rows = match_rows[:size]
+
+    if not exists:
+        return jsonify({"code": 404, "message": "Subscription not found", "data": None}), 404
+
+    # 匹配结果只保存链接，公告内容从当前数据库读取 (已删除的公告自动跳过)
+    links = [row['link'] for row in match_rows]
+    announcements_list = []
+    if links:
+        conn = get_db_connection()
+        placeholders = ",".join("?" * len(links))
+        rows = conn.execute(
+            f"SELECT rowid AS id, * FROM {TABLE_NAME} WHERE link IN ({placeholders}) ORDER BY timestamp DESC", links
+        ).fetchall()
+        conn.close()
+        announcements_list = [serialize_announcement(row) for row in rows]
+
+    return jsonify({
+        "code": 200,
+        "message": "Success",
+        "data": {
+            "subscriptionId": subscription_id,
+            # 下一次请求的游标：最后一条已返回匹配的 (generation, link)
+            "since": match_rows[-1]['generation'] if match_rows else since,
+            "after": match_rows[-1]['link'] if match_rows else after,
+            "hasMore": has_more,
+            "announcements": announcements_list
+        }
+    })
+
+# ====================================================================
+# VI. /api/status 调度守护进程运行状态
+# ====================================================================
+
+@app.route('/api/status', methods=['GET'])
+def get_status():
+    # 由 daemon.py 在启动时注册；单独运行 app.py 时没有调度器
+    scheduler = app.config.get('SCHEDULER')
+    conn = get_db_connection()
+    generation = get_generation(conn)
+    conn.close()
+
+    return jsonify({
+        "code": 200,
+        "message": "Success",
+        "data": {
+            "generation": generation,
+            "scheduler": scheduler.status() if scheduler else None
+        }
+    })
+
+# ====================================================================
+# VII. /api/debug/queries SQL 查询分析汇总
+# ====================================================================
+
+@app.after_request
+def record_request_queries(response):
+    if app.config['QUERY_PROFILE']:
+        return query_profiler.finish_request(response)
+    return response
+
+@app.route('/api/debug/queries', methods=['GET', 'DELETE'])
+def get_query_stats():
+    if not app.config['QUERY_PROFILE']:
+        return jsonify({"code": 404, "message": "Query profiling is disabled (set JLU_OA_QUERY_PROFILE=1)", "data": None}), 404
+
+    if request.method == 'DELETE':
+        query_profiler.query_stats.reset()
+        return jsonify({"code": 200, "message": "Success", "data": None})
+
+    # sort: total (总耗时，默认) / max (单次最大耗时) / count (执行次数)
+    limit = request.args.get('limit', 20, type=int)
+    sort = request.args.get('sort', 'total', type=str)
+
+    return jsonify({
+        "code": 200,
+        "message": "Success",
+        "data": query_profiler.query_stats.summary(limit, sort)
+    })
+
 @app.route('/oa')
 def announcements():
     # 查找 templates/announcements.html 并渲染它
-    return render_template('announcements.html')
+    # 动态渲染时不使用预渲染快照，全部数据走 API；静态发布见 publish_static.py
+    return render_template('announcements.html', snapshot_manifest=None, asset_urls=None)
 
 if __name__ == '__main__':
     # 生产环境中应使用 Gunicorn/uWSGI 等服务器
@@ -0,0 +1,199 @@
+import os
+import random
+import threading
+import time
+
+# 跨进程锁：Windows 使用 msvcrt，其它平台使用 fcntl
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+    import fcntl
+
+import get_data_from_oa as crawler
+import update_db
+import app as api
+import publish_static
+
+# --- 调度配置 ---
+CRAWL_INTERVAL = 30 * 60       # 两次增量抓取之间的基础间隔 (秒)
+CRAWL_JITTER = 5 * 60          # 随机抖动范围 (秒)，避免固定时刻集中访问 OA
+CRAWL_DAYS = 7                 # 每次增量抓取追溯的天数
+LOCK_FILE_PATH = 'daemon.lock' # 跨进程运行锁，防止多个实例同时抓取/导入
+USE_SNAPSHOT_PUBLISH = True    # True: 构建新快照后原子切换 (读者不阻塞)；False: 原地更新数据库
+STATIC_PUBLISH = True          # 导入成功且有变化时重新发布 public/ 下的预渲染静态页面
+
+# --- API 服务配置 ---
+API_HOST = '127.0.0.1'
+API_PORT = 5000
+
+
+class RunLock:
+    """
+    运行锁：进程内使用非阻塞的 threading.Lock，进程间对锁文件的打开句柄加系统文件锁。
+    任一层获取失败都说明已有一次运行在进行中，本次直接跳过。
+    系统文件锁随进程退出自动释放 (包括直接关闭窗口)，因此不存在需要清理的残留锁；
+    锁文件本身保留不删，其中的 PID 仅用于排查。
+    """
+
+    def __init__(self, lock_file_path):
+        self.lock_file_path = lock_file_path
+        self._thread_lock = threading.Lock()
+        self._fd = None
+
+    def acquire(self):
+        if not self._thread_lock.acquire(blocking=False):
+            return False
+        if self._lock_file():
+            return True
+        self._thread_lock.release()
+        return False
+
+    def release(self):
+        try:
+            if msvcrt:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+            self._thread_lock.release()
+
+    def _lock_file(self):
+        fd = os.open(self.lock_file_path, os.O_CREAT | os.O_RDWR)
+        try:
+            if msvcrt:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1) # 锁定第一个字节
+            else:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+
+        # 定长写入 PID，覆盖上一次的内容
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.write(fd, str(os.getpid()).ljust(16).encode())
+        self._fd = fd
+        return True
+
+
+class Scheduler:
+    """按间隔 (带抖动) 执行 增量抓取 -> 进程内导入 -> 通知 API 刷新缓存 的调度器"""
+
+    def __init__(self, interval, jitter, lock):
+        self.interval = interval
+        self.jitter = jitter
+        self.lock = lock
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._last_run = None
+        self._next_run_time = None
+        self._running = False
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="crawl-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _loop(self):
+        while not self._stop_event.is_set():
+            self.run_once()
+            delay = max(60, self.interval + random.uniform(-self.jitter, self.jitter))
+            self._next_run_time = int(time.time() + delay)
+            self._stop_event.wait(delay)
+
+    def run_once(self):
+        """执行一次完整流程，已有运行在进行中时跳过并返回 None"""
+        if not self.lock.acquire():
+            print("⏭️ 上一次抓取/导入仍在进行中，跳过本次调度。")
+            return None
+
+        self._running = True
+        started_at = time.time()
+        result = {
+            "started_at": int(started_at),
+            "duration": None,
+            "success": False,
+            "crawled": 0,
+            "total": None,
+            "changed": None,
+            "deleted": None,
+            "matched": None,
+            "generation": None,
+            "error": None
+        }
+        try:
+            # 1. 增量抓取 (结果同时写回 jlu_oa_data.json，保持与脚本模式兼容)
+            crawled_count, data_list = crawler.run_incremental_update(crawler.DEFAULT_FILE_NAME, CRAWL_DAYS)
+            result["crawled"] = crawled_count
+
+            # 2. 进程内导入数据库
+            if data_list is not None:
+                # 已发布过快照后不能再原地写入 (会写进读者正在使用的快照)
+                if USE_SNAPSHOT_PUBLISH or update_db.snapshots_published():
+                    stats = update_db.publish_snapshot(data_list)
+                else:
+                    conn = update_db.get_db_connection()
+                    try:
+                        update_db.setup_database(conn)
+                        stats = update_db.update_announcements(conn, data_list)
+                    finally:
+                        conn.close()
+
+                if stats:
+                    result.update(stats)
+                    data_changed = stats["changed"] or stats["deleted"]
+                    # 3. 有变化时通知 API 刷新缓存并推送给 SSE 订阅者
+                    if data_changed:
+                        api.invalidate_caches(stats["generation"])
+                    # 4. 重新发布静态页面 (无变化时沿用上次发布的结果)
+                    if STATIC_PUBLISH and (data_changed or not os.path.exists(publish_static.MANIFEST_FILE)):
+                        publish_static.publish_static()
+                    result["success"] = True
+                else:
+                    result["error"] = "数据库导入失败"
+            else:
+                result["error"] = "抓取失败"
+        except Exception as e:
+            result["error"] = str(e)
+            print(f"❌ 调度任务执行失败: {e}")
+        finally:
+            result["duration"] = round(time.time() - started_at, 3)
+            self._last_run = result
+            self._running = False
+            self.lock.release()
+
+        print(f"🕒 本次调度耗时 {result['duration']} 秒，抓取新增 {result['crawled']} 条。")
+        return result
+
+    def status(self):
+        return {
+            "running": self._running,
+            "interval": self.interval,
+            "jitter": self.jitter,
+            "next_run_time": self._next_run_time,
+            "last_run": self._last_run
+        }
+
+
+def main():
+    """守护进程入口：启动调度线程，并在同一进程内运行 API 服务"""
+    # 固定工作目录，保证数据库与 JSON 的相对路径正确
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    print("--- 吉大 OA 调度守护进程启动 ---")
+    scheduler = Scheduler(CRAWL_INTERVAL, CRAWL_JITTER, RunLock(LOCK_FILE_PATH))
+    api.app.config['SCHEDULER'] = scheduler
+    scheduler.start()
+
+    # 关闭 reloader，避免重复启动调度线程
+    print(f"Flask API 服务器启动中... http://{API_HOST}:{API_PORT}/oa")
+    api.app.run(host=API_HOST, port=API_PORT, threaded=True, use_reloader=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,12 +3,17 @@ from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse, parse_qs, urlunparse, urlencode # 确保有 urlencode
 import json
 import os
+import sqlite3
 import time
 from datetime import datetime, timedelta
 
+import similarity
+import update_db
+
 # --- DeepSeek V3 配置 ---
 
-DEEPSEEK_API_KEY = 您的 DeepSeek API Key 应在此处填写
+# 您的 DeepSeek API Key 应在此处填写 (或通过环境变量 DEEPSEEK_API_KEY 提供)
+DEEPSEEK_API_KEY = os.environ.get("DEEPSEEK_API_KEY", "")
 DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions" 
 DEEPSEEK_MODEL = "deepseek-chat"
 
@@ -133,6 +138,7 @@ def save_data_to_json(data, filename):
     with open(filename, 'w', encoding='utf-8') as f:
         json.dump(data_list, f, ensure_ascii=False, indent=4)
     print(f"\n✅ 数据成功保存到 {filename}，共 {len(data_list)} 条记录。")
+    return data_list
 
 
 
@@ -279,10 +285,11 @@ def simplify_jlu_oa_link(full_link_original):
     return simplified_link
 
 
-def fetch_news_data(start_page, end_page, max_date=None, delay=0.5, existing_keys=None, max_no_new_pages=10):
+def fetch_news_data(start_page, end_page, max_date=None, delay=0.5, existing_keys=None, max_no_new_pages=10, tag_lookup=None):
     """
     核心爬虫函数：按页码范围抓取新闻，并以页为单位进行批量分类。
     已应用：链接简化提前，确保去重和输出都使用简化链接。
+    tag_lookup(title) 可返回近重复旧公告的 (一级TAG, 二级TAGs)，命中时直接复用，不再调用 LLM。
     """
     # 确保依赖的全局变量可用（此处假设它们在文件中的其他位置已定义）
     global BASE_URL, LIST_URL_TEMPLATE, HEADERS, DEEPSEEK_API_KEY, MAX_LLM_BATCH_SIZE, parse_time_string
@@ -399,12 +406,23 @@ def fetch_news_data(start_page, end_page, max_date=None, delay=0.5, existing_key
         # --- 第二阶段：LLM 批量分类和数据合并 ---
         if page_new_entries_list:
             
-            total_new_on_page = len(page_new_entries_list)
+            # 先从近重复的已有公告复用分类 (置顶副本、补充通知、逐年重复等)，只把剩余标题交给 LLM
+            reused_tags_map = {}
+            if tag_lookup:
+                for item in page_new_entries_list:
+                    reused_tags = tag_lookup(item["新闻标题"])
+                    if reused_tags:
+                        reused_tags_map[item["新闻标题"]] = reused_tags
+                if reused_tags_map:
+                    print(f"    ♻️ {len(reused_tags_map)} 条新闻与已有公告高度相似，直接复用分类。")
+
+            entries_to_classify = [item for item in page_new_entries_list if item["新闻标题"] not in reused_tags_map]
+            total_new_on_page = len(entries_to_classify)
             all_classification_results = []
             
             # 循环分割成小批量 (<= MAX_LLM_BATCH_SIZE) 进行分类
             for i in range(0, total_new_on_page, MAX_LLM_BATCH_SIZE):
-                batch = page_new_entries_list[i:i + MAX_LLM_BATCH_SIZE]
+                batch = entries_to_classify[i:i + MAX_LLM_BATCH_SIZE]
                 titles_to_classify = [item["新闻标题"] for item in batch]
                 
                 # 调用批量分类函数
@@ -425,7 +443,9 @@ def fetch_news_data(start_page, end_page, max_date=None, delay=0.5, existing_key
                 
                 classification = classified_titles_map.get(title)
                 
-                if classification:
+                if title in reused_tags_map:
+                    item["一级分类TAG"], item["二级分类TAG"] = reused_tags_map[title]
+                elif classification:
                     item["一级分类TAG"] = classification.get("一级分类", "分类失败")
                     item["二级分类TAG"] = classification.get("二级分类", ["分类失败"])
                 else:
@@ -470,7 +490,56 @@ def fetch_news_data(start_page, end_page, max_date=None, delay=0.5, existing_key
 
     return new_data
 
-# --- 主程序入口 ---
+def run_incremental_update(filename=DEFAULT_FILE_NAME, days=7):
+    """
+    模式 1 的核心流程：抓取最近 days 天的新闻并增量合并到 filename。
+    返回 (本次新增条数, 合并后的完整数据列表)；抓取失败时数据列表为 None。
+    供 main() 与调度守护进程 daemon.py 复用。
+    """
+    # ⚠️ load_existing_data 现在返回的是以简化链接为键的字典
+    existing_news_dict = load_existing_data(filename)
+    # ⚠️ existing_keys 集合现在包含的是简化链接，与 fetch_news_data 的去重逻辑一致
+    existing_keys = set(existing_news_dict.keys()) 
+    since_date = datetime.now(tz=None) - timedelta(days=days) 
+    
+    print(f"\n--- 模式 1: 自动增量更新 ---")
+    print(f"目标文件: {filename} (包含 {len(existing_keys)} 条旧记录)")
+    print(f"抓取范围: 追溯到 {since_date.strftime('%Y-%m-%d %H:%M')} 的新闻 (最多 10 页)")
+    
+    # 打开当前数据库的标题相似度索引，用于复用近重复公告的分类
+    tag_lookup = None
+    db_conn = None
+    db_path = update_db.resolve_database_path()
+    if os.path.exists(db_path):
+        db_conn = sqlite3.connect(db_path)
+
+        def tag_lookup(title):
+            try:
+                return similarity.find_tags_for_title(db_conn, title)
+            except sqlite3.OperationalError:
+                return None # 旧数据库尚未建立相似度索引
+
+    try:
+        new_entries = fetch_news_data(
+            start_page=1, 
+            end_page=10, 
+            max_date=since_date, 
+            delay=1.0, 
+            existing_keys=existing_keys,
+            tag_lookup=tag_lookup
+        ) 
+    finally:
+        if db_conn:
+            db_conn.close()
+    
+    if new_entries is None:
+        return 0, None
+
+    # ⚠️ 合并时，由于 new_entries 和 existing_news_dict 的键都是简化链接，合并将准确无误。
+    combined_data = {**existing_news_dict, **new_entries}
+    print(f"\n✨ 本次执行新增新闻 {len(new_entries)} 条。")
+    data_list = save_data_to_json(combined_data, filename)
+    return len(new_entries), data_list
 
 # --- 主程序入口 ---
 
@@ -490,33 +559,7 @@ def main():
     print("自动选择了自动模式！")
 
     if mode == '1':
-        # --- 模式 1: 自动增量更新 ---
-        filename = DEFAULT_FILE_NAME
-        # ⚠️ load_existing_data 现在返回的是以简化链接为键的字典
-        existing_news_dict = load_existing_data(filename)
-        # ⚠️ existing_keys 集合现在包含的是简化链接，与 fetch_news_data 的去重逻辑一致
-        existing_keys = set(existing_news_dict.keys()) 
-        seven_days_ago = datetime.now(tz=None) - timedelta(days=7) 
-        
-        print(f"\n--- 模式 1: 自动增量更新 ---")
-        print(f"目标文件: {filename} (包含 {len(existing_keys)} 条旧记录)")
-        print(f"抓取范围: 追溯到 {seven_days_ago.strftime('%Y-%m-%d %H:%M')} 的新闻 (最多 10 页)")
-        
-        new_entries = fetch_news_data(
-            start_page=1, 
-            end_page=10, 
-            max_date=seven_days_ago, 
-            delay=1.0, 
-            existing_keys=existing_keys
-        ) 
-        
-        if new_entries is not None:
-            # ⚠️ 合并时，由于 new_entries 和 existing_news_dict 的键都是简化链接，合并将准确无误。
-            combined_data = {**existing_news_dict, **new_entries}
-            print(f"\n✨ 本次执行新增新闻 {len(new_entries)} 条。")
-            save_data_to_json(combined_data, filename)
-
-
+        run_incremental_update()
 
     else:
         print("输入无效的模式编号，程序退出。")
@@ -0,0 +1,185 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import time
+
+import app as api
+
+# 可选依赖：未安装时跳过对应产物
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# --- 发布配置 ---
+# public/ 目录可直接交给任意静态文件服务器 (如 nginx) 托管：
+#   /oa/            -> public/oa/index.html (默认视图)
+#   /assets/, /data/ -> 带内容指纹的静态资源与预渲染数据，可永久缓存
+#   /api/           -> 反向代理到 Flask，只处理非默认查询
+# nginx 可使用 gzip_static / brotli_static 直接发送预压缩的 .gz / .br 文件。
+PUBLIC_DIR = 'public'
+STATIC_DIR = 'static'
+MANIFEST_FILE = os.path.join(PUBLIC_DIR, 'manifest.json')
+STATIC_PAGES = 5           # 预渲染默认视图 (time_desc) 的前 N 页
+PAGE_SIZE = 20             # 与前端 loadAnnouncements 的 size 保持一致
+IMAGE_VARIANT_WIDTHS = (1280,)  # 小屏背景图宽度
+COMPRESSIBLE_EXTENSIONS = ('.html', '.json', '.ico', '.svg', '.css', '.js')
+
+
+def fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def write_file(relative_path, data, written):
+    """写入 public/ 下的文件 (先写临时文件再 os.replace)，并生成预压缩版本"""
+    path = os.path.join(PUBLIC_DIR, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    outputs = [(path, data)]
+    if relative_path.endswith(COMPRESSIBLE_EXTENSIONS):
+        outputs.append((path + '.gz', gzip.compress(data, compresslevel=9, mtime=0)))
+        if brotli:
+            outputs.append((path + '.br', brotli.compress(data, quality=11)))
+
+    for output_path, output_data in outputs:
+        tmp_path = output_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(output_data)
+        os.replace(tmp_path, output_path)
+        written.add(os.path.relpath(output_path, PUBLIC_DIR).replace(os.sep, '/'))
+
+
+def write_fingerprinted(directory, name, extension, data, written):
+    """按内容指纹命名并写入，返回站点内的绝对 URL"""
+    relative_path = f"{directory}/{name}.{fingerprint(data)}{extension}"
+    write_file(relative_path, data, written)
+    return '/' + relative_path
+
+
+def reuse_images(previous_manifest, source_fingerprint, written):
+    """原图未变化且上次生成的文件仍在时直接沿用，避免每次发布都重新编码 (WebP 编码约需数秒)"""
+    if previous_manifest.get("image_source") != source_fingerprint:
+        return None
+    asset_urls = previous_manifest.get("images") or {}
+    relative_paths = [url.lstrip('/') for url in asset_urls.values()]
+    if not relative_paths or not all(os.path.exists(os.path.join(PUBLIC_DIR, path)) for path in relative_paths):
+        return None
+    written.update(relative_paths)
+    return dict(asset_urls)
+
+
+def publish_images(written, previous_manifest):
+    """发布背景图：原图加指纹，若安装了 Pillow 则额外生成 WebP 与小屏尺寸版本。返回 (资源 URL, 原图指纹)"""
+    with open(os.path.join(STATIC_DIR, 'bg.jpg'), 'rb') as f:
+        original = f.read()
+    source_fingerprint = fingerprint(original)
+    asset_urls = reuse_images(previous_manifest, source_fingerprint, written)
+    if asset_urls is not None:
+        return asset_urls, source_fingerprint
+
+    asset_urls = {'bg.jpg': write_fingerprinted('assets', 'bg', '.jpg', original, written)}
+
+    if Image is None:
+        print("ℹ️ 未安装 Pillow，跳过背景图优化版本。")
+        return asset_urls, source_fingerprint
+
+    image = Image.open(io.BytesIO(original)).convert('RGB')
+    variants = [('bg', image)]
+    for width in IMAGE_VARIANT_WIDTHS:
+        if image.width > width:
+            height = round(image.height * width / image.width)
+            variants.append((f'bg-{width}', image.resize((width, height), Image.LANCZOS)))
+
+    for name, variant in variants:
+        for extension, image_format, options in (('.jpg', 'JPEG', {"quality": 82, "optimize": True, "progressive": True}),
+                                                 ('.webp', 'WEBP', {"quality": 80, "method": 6})):
+            if name == 'bg' and extension == '.jpg':
+                continue  # 原图已发布
+            buffer = io.BytesIO()
+            variant.save(buffer, image_format, **options)
+            asset_urls[name + extension] = write_fingerprinted('assets', name, extension, buffer.getvalue(), written)
+    return asset_urls, source_fingerprint
+
+
+def publish_data(client, pages, written):
+    """预渲染筛选条件与默认视图前 N 页的 JSON"""
+    filters_response = client.get('/api/filters')
+    manifest = {
+        "filters": write_fingerprinted('data', 'filters', '.json', filters_response.data, written),
+        "pageSize": PAGE_SIZE,
+        "pages": {}
+    }
+
+    for page in range(1, pages + 1):
+        response = client.get(f'/api/announcements?page={page}&size={PAGE_SIZE}&sort=time_desc')
+        manifest["pages"][page] = write_fingerprinted('data', f'announcements-page-{page}', '.json', response.data, written)
+        if page >= response.get_json()["data"]["totalPages"]:
+            break
+    return manifest
+
+
+def prune_public_files(keep):
+    """删除既不属于本次也不属于上一次发布的文件 (上一版 HTML 在缓存中时仍可加载其资源)"""
+    for root, _, files in os.walk(PUBLIC_DIR):
+        for name in files:
+            relative_path = os.path.relpath(os.path.join(root, name), PUBLIC_DIR).replace(os.sep, '/')
+            if relative_path not in keep and relative_path != 'manifest.json':
+                os.remove(os.path.join(root, name))
+
+
+def publish_static(pages=STATIC_PAGES):
+    """
+    渲染 announcements.html、默认视图前 N 页与筛选条件 JSON 到 public/，
+    生成预压缩文件与指纹资源。入口 HTML 最后写入，保证其引用的文件已全部就绪。
+    """
+    start = time.time()
+    os.makedirs(PUBLIC_DIR, exist_ok=True)
+    written = set()
+
+    try:
+        with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            previous_manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        previous_manifest = {}
+    previous_files = set(previous_manifest.get("files", []))
+
+    # 1. 静态资源
+    image_urls, image_source = publish_images(written, previous_manifest)
+    with open(os.path.join(STATIC_DIR, 'favicon.ico'), 'rb') as f:
+        write_file('favicon.ico', f.read(), written)
+    asset_urls = dict(image_urls, **{'favicon.ico': '/favicon.ico'})
+
+    # 2. 预渲染数据
+    # 先读取代数再渲染：期间若有新数据发布，页面订阅时会多收到一次推送而不会漏掉更新
+    client = api.app.test_client()
+    generation = client.get('/api/status').get_json()["data"]["generation"]
+    snapshot_manifest = publish_data(client, pages, written)
+    snapshot_manifest["generation"] = generation
+
+    # 3. 入口页面
+    with api.app.test_request_context('/oa'):
+        html = api.render_template(
+            'announcements.html', snapshot_manifest=snapshot_manifest, asset_urls=asset_urls
+        ).encode('utf-8')
+    write_file('oa/index.html', html, written)
+
+    # 4. 记录清单并清理过期文件
+    with open(MANIFEST_FILE, 'w', encoding='utf-8') as f:
+        json.dump({"published_at": int(time.time()), "snapshot": snapshot_manifest, "assets": asset_urls,
+                   "images": image_urls, "image_source": image_source, "files": sorted(written)},
+                  f, ensure_ascii=False, indent=4)
+    prune_public_files(written | previous_files)
+
+    print(f"✅ 静态快照已发布到 {PUBLIC_DIR}/，共 {len(written)} 个文件，"
+          f"预渲染 {len(snapshot_manifest['pages'])} 页，耗时 {time.time() - start:.2f} 秒。")
+    return snapshot_manifest
+
+
+if __name__ == "__main__":
+    publish_static()
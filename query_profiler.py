@@ -0,0 +1,295 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from logging.handlers import RotatingFileHandler
+
+from flask import g, has_request_context, request
+
+# --- 分析配置 ---
+# 默认关闭；关闭时 get_db_connection 返回普通的 sqlite3.Connection，没有任何额外开销。
+PROFILE_ENABLED = os.environ.get("JLU_OA_QUERY_PROFILE", "0") == "1"
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get("JLU_OA_SLOW_QUERY_MS", "50"))  # 超过此耗时记录 EXPLAIN QUERY PLAN 并写入慢查询日志
+SLOW_QUERY_LOG_FILE = 'slow_queries.log'
+SLOW_QUERY_LOG_MAX_BYTES = 5 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 3
+RECENT_REQUEST_LIMIT = 50   # 保留最近多少个请求的逐条查询记录
+PARAM_REPR_LIMIT = 200      # 单个参数在日志中的最大长度
+PLAN_CACHE_LIMIT = 1000     # 缓存的执行计划数量 (按 SQL 原文)
+
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def query_shape(sql):
+    """
+    归一化 SQL 为查询形状：字面量替换为 ?，IN 列表折叠，空白合并。
+    例如不同页码的 LIMIT 20 OFFSET 40 与 LIMIT 20 OFFSET 60 归为同一形状。
+    """
+    shape = _STRING_LITERAL_RE.sub("?", sql)
+    shape = _NUMBER_RE.sub("?", shape)
+    shape = _IN_LIST_RE.sub("IN (...)", shape)
+    return _WHITESPACE_RE.sub(" ", shape).strip()
+
+
+def format_params(params):
+    if params is None:
+        return []
+    values = params.values() if isinstance(params, dict) else params
+    formatted = []
+    for value in values:
+        text = repr(value)
+        formatted.append(text if len(text) <= PARAM_REPR_LIMIT else text[:PARAM_REPR_LIMIT] + "...")
+    return formatted
+
+
+# ====================================================================
+# 统计汇总
+# ====================================================================
+
+class QueryStats:
+    """按查询形状汇总执行次数与耗时，并保留最近若干请求的逐条记录 (线程安全)"""
+
+    def __init__(self, recent_limit):
+        self._lock = threading.Lock()
+        self._shapes = {}
+        self._recent_requests = deque(maxlen=recent_limit)
+        self._plan_cache = {}
+        self.started_at = int(time.time())
+
+    def record(self, record):
+        with self._lock:
+            stats = self._shapes.get(record["shape"])
+            if stats is None:
+                stats = self._shapes[record["shape"]] = {
+                    "shape": record["shape"],
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "rows": 0,
+                    "slow_count": 0,
+                    "slowest": None
+                }
+            stats["count"] += 1
+            stats["total_ms"] += record["duration_ms"]
+            stats["rows"] += record["rows"]
+            if record["slow"]:
+                stats["slow_count"] += 1
+            if record["duration_ms"] >= stats["max_ms"]:
+                stats["max_ms"] = record["duration_ms"]
+                stats["slowest"] = {key: record[key] for key in ("sql", "params", "duration_ms", "plan", "path")}
+
+    def record_request(self, path, records):
+        if not records:
+            return
+        with self._lock:
+            self._recent_requests.append({
+                "path": path,
+                "time": int(time.time()),
+                "query_count": len(records),
+                "total_ms": round(sum(record["duration_ms"] for record in records), 3),
+                "queries": [{key: record[key] for key in ("shape", "params", "duration_ms", "rows", "slow", "plan")}
+                            for record in records]
+            })
+
+    def cached_plan(self, sql):
+        with self._lock:
+            return self._plan_cache.get(sql)
+
+    def cache_plan(self, sql, plan):
+        with self._lock:
+            if len(self._plan_cache) >= PLAN_CACHE_LIMIT:
+                self._plan_cache.clear()
+            self._plan_cache[sql] = plan
+
+    def summary(self, limit=20, sort='total'):
+        sort_key = {"total": "total_ms", "max": "max_ms", "count": "count"}.get(sort, "total_ms")
+        with self._lock:
+            shapes = sorted(self._shapes.values(), key=lambda stats: stats[sort_key], reverse=True)[:limit]
+            shapes = [dict(stats, total_ms=round(stats["total_ms"], 3), max_ms=round(stats["max_ms"], 3),
+                           avg_ms=round(stats["total_ms"] / stats["count"], 3)) for stats in shapes]
+            recent_requests = list(self._recent_requests)[-limit:]
+            shape_count = len(self._shapes)
+        return {
+            "since": self.started_at,
+            "threshold_ms": SLOW_QUERY_THRESHOLD_MS,
+            "shape_count": shape_count,
+            "top_shapes": shapes,
+            "recent_requests": recent_requests[::-1]
+        }
+
+    def reset(self):
+        with self._lock:
+            self._shapes.clear()
+            self._recent_requests.clear()
+            self.started_at = int(time.time())
+
+
+query_stats = QueryStats(RECENT_REQUEST_LIMIT)
+
+_slow_logger = None
+_slow_logger_lock = threading.Lock()
+
+
+def get_slow_logger():
+    """首次出现慢查询时才创建日志文件"""
+    global _slow_logger
+    with _slow_logger_lock:
+        if _slow_logger is None:
+            logger = logging.getLogger("jlu_oa.slow_query")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            handler = RotatingFileHandler(SLOW_QUERY_LOG_FILE, maxBytes=SLOW_QUERY_LOG_MAX_BYTES,
+                                          backupCount=SLOW_QUERY_LOG_BACKUPS, encoding='utf-8')
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            logger.addHandler(handler)
+            _slow_logger = logger
+    return _slow_logger
+
+
+# ====================================================================
+# 带计时的连接与游标
+# ====================================================================
+
+class ProfiledCursor(sqlite3.Cursor):
+    """
+    记录每条语句的耗时。SQLite 按需逐行求值，因此耗时包括 execute 以及之后 fetch 的时间，
+    语句在连接关闭时统一结算。
+    """
+
+    def execute(self, sql, parameters=()):
+        self._begin(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._current["duration"] += time.perf_counter() - start
+
+    def executemany(self, sql, seq_of_parameters):
+        self._begin(sql, None)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._current["duration"] += time.perf_counter() - start
+
+    def _begin(self, sql, parameters):
+        self._current = {"sql": sql, "parameters": parameters, "duration": 0.0, "rows": 0}
+        self.connection._pending.append(self._current)
+
+    def _timed_fetch(self, fetch, *args):
+        start = time.perf_counter()
+        try:
+            return fetch(*args)
+        finally:
+            self._current["duration"] += time.perf_counter() - start
+
+    def fetchone(self):
+        row = self._timed_fetch(super().fetchone)
+        if row is not None:
+            self._current["rows"] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed_fetch(super().fetchmany, self.arraysize if size is None else size)
+        self._current["rows"] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed_fetch(super().fetchall)
+        self._current["rows"] += len(rows)
+        return rows
+
+    def __next__(self):
+        row = self._timed_fetch(super().__next__)
+        self._current["rows"] += 1
+        return row
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """通过 sqlite3.connect(factory=ProfiledConnection) 使用，所有语句都经过 ProfiledCursor"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pending = []
+        self._path = request.path if has_request_context() else None
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def close(self):
+        try:
+            self.flush_profile()
+        finally:
+            super().close()
+
+    def flush_profile(self):
+        """结算本连接上已执行的语句：汇总统计，慢查询补充执行计划并写日志"""
+        pending, self._pending = self._pending, []
+        for item in pending:
+            record = {
+                "sql": item["sql"],
+                "shape": query_shape(item["sql"]),
+                "params": format_params(item["parameters"]),
+                "duration_ms": round(item["duration"] * 1000, 3),
+                "rows": item["rows"],
+                "slow": item["duration"] * 1000 >= SLOW_QUERY_THRESHOLD_MS,
+                "plan": None,
+                "path": self._path
+            }
+            if record["slow"]:
+                record["plan"] = self._explain(item["sql"], item["parameters"])
+                get_slow_logger().info(
+                    "%.1fms rows=%d path=%s sql=%s params=[%s] plan=%s",
+                    record["duration_ms"], record["rows"], record["path"], record["shape"],
+                    ", ".join(record["params"]), " | ".join(record["plan"] or [])
+                )
+
+            query_stats.record(record)
+            if has_request_context():
+                g.setdefault("query_records", []).append(record)
+
+    def _explain(self, sql, parameters):
+        if parameters is None or not sql.lstrip().upper().startswith(("SELECT", "WITH")):
+            return None
+        plan = query_stats.cached_plan(sql)
+        if plan is None:
+            try:
+                # 直接使用父类游标，避免 EXPLAIN 本身被记录
+                rows = sqlite3.Cursor(self).execute(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+            except sqlite3.Error as e:
+                return [f"EXPLAIN 失败: {e}"]
+            plan = [row[3] for row in rows]
+            query_stats.cache_plan(sql, plan)
+        return plan
+
+
+def finish_request(response):
+    """
+    after_request 钩子：保存本请求的逐条查询记录，并在响应头中附带查询次数与总耗时。
+    流式响应 (如 /api/export) 的查询在生成器中执行，连接在 after_request 之后才关闭，
+    因此不设置响应头，改为在响应关闭时记录；未使用 stream_with_context 的生成器
+    (如 /api/announcements/stream) 中的查询不属于任何请求，只计入按形状的汇总。
+    """
+    path = request.full_path.rstrip('?')
+    if response.is_streamed:
+        records = g.setdefault("query_records", [])
+        response.call_on_close(lambda: query_stats.record_request(path, records))
+        return response
+
+    records = g.pop("query_records", [])
+    query_stats.record_request(path, records)
+    response.headers["X-Query-Count"] = str(len(records))
+    response.headers["X-Query-Time-Ms"] = f"{sum(record['duration_ms'] for record in records):.3f}"
+    return response
@@ -0,0 +1,354 @@
+import hashlib
+import json
+import random
+import re
+import sqlite3
+import struct
+import sys
+import time
+from functools import lru_cache
+
+# --- 表名配置 (与 update_db.py / app.py 保持一致) ---
+TABLE_NAME = 'announcements'
+SIGNATURE_TABLE_NAME = 'title_minhash'  # 每条公告标题的 MinHash 签名
+LSH_TABLE_NAME = 'title_lsh'            # LSH 分桶索引：(band, bucket) -> link
+
+# --- MinHash / LSH 参数 ---
+# 签名由 32 个 16 bit 的最小哈希值组成，切成 8 个 band，每个 band 4 个值恰好拼成一个 64 bit 整数作为桶号。
+# 两个标题至少有一个 band 完全相同才会成为候选，Jaccard 为 J 的两条标题成为候选的概率为 1-(1-J^4)^8：
+#   J=0.5: 0.40  J=0.6: 0.67  J=0.7: 0.89  J=0.75: 0.95  J=0.8: 0.985  J=0.85: 0.997
+# 因此索引只适合查询 0.7 以上的相似度。更短的 band (如 16x2) 能照顾低相似度，但“关于”“通知”等
+# 高频 shingle 会让桶急剧膨胀 (10 万条合成标题下每次查询的候选数从 2 条增加到约 6400 条)。
+SHINGLE_SIZE = 2
+NUM_PERM = 32
+LSH_BANDS = 8
+LSH_ROWS = NUM_PERM // LSH_BANDS
+
+RELATED_THRESHOLD = 0.7    # /related 接口的默认相似度
+RELATED_MIN_THRESHOLD = 0.7 # /related 接口允许的最低相似度，更低时召回率不足九成
+DUPLICATE_THRESHOLD = 0.85  # 视为重复发布 (列表折叠) 的相似度
+TAG_COPY_THRESHOLD = 0.9   # 爬虫直接复用分类结果的相似度
+UNCLASSIFIED_TAGS = ("未分类", "分类失败")
+
+CREATE_SIMILARITY_TABLES_SQL = f"""
+CREATE TABLE IF NOT EXISTS {SIGNATURE_TABLE_NAME} (
+    link TEXT PRIMARY KEY,
+    signature BLOB NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS {LSH_TABLE_NAME} (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    link TEXT NOT NULL,
+    PRIMARY KEY (band, bucket, link)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_{LSH_TABLE_NAME}_link ON {LSH_TABLE_NAME} (link);
+"""
+
+# OA 重复发布时常见的前后缀：置顶标记、补充/更正通知等，归一化时去掉
+_NOISE_PATTERN = re.compile(r"[\[【（(]?\s*(置顶|补充通知|更正|再通知|转发)\s*[\]】）)]?")
+_DIGIT_PATTERN = re.compile(r"\d+")
+_PUNCT_PATTERN = re.compile(r"[\W_]+")
+
+_SIGNATURE_STRUCT = struct.Struct(f"<{NUM_PERM}H")
+_BUCKET_STRUCT = struct.Struct(f"<{LSH_BANDS}q")
+
+
+def normalize_title(title):
+    """去掉置顶/补充等标记与标点，并把数字统一为 0，使逐年重复的通知归一到同一文本"""
+    title = _NOISE_PATTERN.sub('', title)
+    title = _DIGIT_PATTERN.sub('0', title)
+    title = _PUNCT_PATTERN.sub('', title)
+    return title.lower()
+
+
+@lru_cache(maxsize=1 << 18)
+def _shingle_hashes(shingle):
+    """一次 blake2b 得到 64 字节，拆成 32 个 16 bit 值，相当于 32 个独立哈希函数"""
+    digest = hashlib.blake2b(shingle.encode('utf-8'), digest_size=64).digest()
+    return _SIGNATURE_STRUCT.unpack(digest)
+
+
+def title_signature(title):
+    """计算标题字符 shingle 的 MinHash 签名 (长度 NUM_PERM 的元组)"""
+    text = normalize_title(title)
+    if len(text) <= SHINGLE_SIZE:
+        shingles = {text}
+    else:
+        shingles = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+    rows = [_shingle_hashes(shingle) for shingle in shingles]
+    if len(rows) == 1:
+        return rows[0]
+    return tuple(map(min, *rows))
+
+
+def pack_signature(signature):
+    return _SIGNATURE_STRUCT.pack(*signature)
+
+
+def unpack_signature(blob):
+    return _SIGNATURE_STRUCT.unpack(blob)
+
+
+def band_buckets(signature):
+    """把签名切成 LSH_BANDS 个 band，每个 band 打包为一个有符号 64 bit 整数桶号"""
+    return _BUCKET_STRUCT.unpack(pack_signature(signature))
+
+
+def estimate_similarity(signature_a, signature_b):
+    """签名中相同位置取值相等的比例，即 Jaccard 相似度的估计"""
+    same = sum(1 for a, b in zip(signature_a, signature_b) if a == b)
+    return same / NUM_PERM
+
+
+# ====================================================================
+# 索引维护
+# ====================================================================
+
+def setup_similarity_tables(conn):
+    """创建签名表与 LSH 表；公告表有数据但索引为空时 (旧数据库) 全量构建一次"""
+    cursor = conn.cursor()
+    cursor.executescript(CREATE_SIMILARITY_TABLES_SQL)
+
+    needs_build = (
+        cursor.execute(f"SELECT 1 FROM {TABLE_NAME} LIMIT 1").fetchone()
+        and not cursor.execute(f"SELECT 1 FROM {SIGNATURE_TABLE_NAME} LIMIT 1").fetchone()
+    )
+    if needs_build:
+        rebuild_similarity_index(cursor)
+    conn.commit()
+
+
+def index_titles(cursor, rows, replace=True):
+    """为 (link, title) 序列写入签名与 LSH 分桶；replace 为 True 时先移除这些链接的旧索引"""
+    signature_records = []
+    bucket_records = []
+    for link, title in rows:
+        signature = title_signature(title)
+        signature_records.append((link, pack_signature(signature)))
+        for band, bucket in enumerate(band_buckets(signature)):
+            bucket_records.append((band, bucket, link))
+
+    if replace:
+        remove_titles(cursor, [record[0] for record in signature_records])
+    cursor.executemany(f"INSERT INTO {SIGNATURE_TABLE_NAME} (link, signature) VALUES (?, ?)", signature_records)
+    cursor.executemany(f"INSERT OR IGNORE INTO {LSH_TABLE_NAME} (band, bucket, link) VALUES (?, ?, ?)", bucket_records)
+
+
+def remove_titles(cursor, links):
+    """从签名表与 LSH 表中移除指定链接"""
+    link_params = [(link,) for link in links]
+    cursor.executemany(f"DELETE FROM {SIGNATURE_TABLE_NAME} WHERE link = ?", link_params)
+    cursor.executemany(f"DELETE FROM {LSH_TABLE_NAME} WHERE link = ?", link_params)
+
+
+def get_signature(cursor, link):
+    row = cursor.execute(f"SELECT signature FROM {SIGNATURE_TABLE_NAME} WHERE link = ?", (link,)).fetchone()
+    return unpack_signature(row[0]) if row else None
+
+
+def find_similar(cursor, signature, threshold=RELATED_THRESHOLD, limit=None, exclude_link=None):
+    """
+    通过 LSH 分桶查找相似标题，返回按相似度降序的 [(link, score), ...]。
+    每个 band 只做一次主键查找，耗时与候选数量相关而与总行数无关。
+    只能找到进入同一个桶的候选，threshold 低于 RELATED_MIN_THRESHOLD 时会漏掉大部分结果。
+    """
+    candidates = set()
+    bucket_query = f"SELECT link FROM {LSH_TABLE_NAME} WHERE band = ? AND bucket = ?"
+    for band, bucket in enumerate(band_buckets(signature)):
+        candidates.update(row[0] for row in cursor.execute(bucket_query, (band, bucket)))
+    candidates.discard(exclude_link)
+
+    results = []
+    signature_query = f"SELECT signature FROM {SIGNATURE_TABLE_NAME} WHERE link = ?"
+    for link in candidates:
+        row = cursor.execute(signature_query, (link,)).fetchone()
+        if not row:
+            continue
+        score = estimate_similarity(signature, unpack_signature(row[0]))
+        if score >= threshold:
+            results.append((link, score))
+
+    results.sort(key=lambda item: item[1], reverse=True)
+    return results[:limit] if limit else results
+
+
+def _neighbor_links(cursor, links, threshold=DUPLICATE_THRESHOLD):
+    """取出一批链接按当前已存签名计算的近重复邻居"""
+    neighbors = set()
+    for link in links:
+        signature = get_signature(cursor, link)
+        if signature is not None:
+            neighbors.update(neighbor for neighbor, _ in find_similar(cursor, signature, threshold, exclude_link=link))
+    return neighbors
+
+
+def _assign_duplicates(cursor, links, pair_scores):
+    """
+    根据近重复关系写入 dup_of：若存在更新 (时间戳更大) 的近重复公告，则指向其中最新的一条，
+    否则置空。折叠模式下只显示 dup_of 为空的公告，即每组重复中最新的一条。
+    """
+    if not links:
+        return
+
+    order = {}
+    related_links = set(links)
+    for neighbors in pair_scores.values():
+        related_links.update(neighbors)
+    link_list = list(related_links)
+    for i in range(0, len(link_list), 500):
+        chunk = link_list[i:i + 500]
+        placeholders = ",".join("?" * len(chunk))
+        for row in cursor.execute(f"SELECT link, timestamp FROM {TABLE_NAME} WHERE link IN ({placeholders})", chunk):
+            order[row[0]] = (row[1], row[0])
+
+    updates = []
+    for link in links:
+        if link not in order:
+            continue  # 已被删除
+        newer = [n for n in pair_scores.get(link, ()) if n in order and order[n] > order[link]]
+        updates.append((max(newer, key=order.get) if newer else None, link))
+    cursor.executemany(f"UPDATE {TABLE_NAME} SET dup_of = ? WHERE link = ?", updates)
+
+
+def sync_similarity_index(cursor, changed_links, deleted_links):
+    """
+    导入事务内调用：只针对本次新增/变化/删除的公告维护索引与 dup_of，
+    并重新计算受影响的近重复邻居 (包括变化前后的邻居)。
+    """
+    changed_links = list(changed_links)
+    deleted_links = list(deleted_links)
+    if not changed_links and not deleted_links:
+        return
+
+    # 1. 旧签名下的邻居 (删除或标题变化后需要重新判断它们的 dup_of)
+    affected = _neighbor_links(cursor, changed_links + deleted_links)
+    remove_titles(cursor, deleted_links)
+
+    # 2. 为新增/变化的公告重新建立签名与分桶
+    title_rows = []
+    for i in range(0, len(changed_links), 500):
+        chunk = changed_links[i:i + 500]
+        placeholders = ",".join("?" * len(chunk))
+        title_rows.extend(cursor.execute(f"SELECT link, title FROM {TABLE_NAME} WHERE link IN ({placeholders})", chunk).fetchall())
+    index_titles(cursor, [(row[0], row[1]) for row in title_rows])
+
+    # 3. 重新计算新旧邻居的近重复关系
+    affected.update(changed_links)
+    affected.update(_neighbor_links(cursor, changed_links))
+    affected.difference_update(deleted_links)
+
+    pair_scores = {}
+    for link in affected:
+        signature = get_signature(cursor, link)
+        if signature is not None:
+            pair_scores[link] = [n for n, _ in find_similar(cursor, signature, DUPLICATE_THRESHOLD, exclude_link=link)]
+    _assign_duplicates(cursor, list(affected), pair_scores)
+
+
+def rebuild_similarity_index(cursor):
+    """全量重建：逐行建索引后按 LSH 桶分组批量找出近重复对，避免逐行查询"""
+    cursor.execute(f"DELETE FROM {SIGNATURE_TABLE_NAME}")
+    cursor.execute(f"DELETE FROM {LSH_TABLE_NAME}")
+    rows = cursor.execute(f"SELECT link, title FROM {TABLE_NAME}").fetchall()
+    index_titles(cursor, [(row[0], row[1]) for row in rows], replace=False)
+
+    signatures = {
+        row[0]: unpack_signature(row[1])
+        for row in cursor.execute(f"SELECT link, signature FROM {SIGNATURE_TABLE_NAME}")
+    }
+    pair_scores = {}
+    bucket_groups = cursor.execute(f"""
+    SELECT group_concat(link, char(31)) FROM {LSH_TABLE_NAME}
+    GROUP BY band, bucket HAVING COUNT(*) > 1
+    """).fetchall()
+    for (group,) in bucket_groups:
+        members = group.split("\x1f")
+        for i, a in enumerate(members):
+            for b in members[i + 1:]:
+                if estimate_similarity(signatures[a], signatures[b]) >= DUPLICATE_THRESHOLD:
+                    pair_scores.setdefault(a, set()).add(b)
+                    pair_scores.setdefault(b, set()).add(a)
+
+    cursor.execute(f"UPDATE {TABLE_NAME} SET dup_of = NULL")
+    _assign_duplicates(cursor, list(pair_scores), pair_scores)
+    print(f"相似度索引重建完成：{len(signatures)} 条标题，{len(pair_scores)} 条存在近重复。")
+
+
+def find_tags_for_title(conn, title, threshold=TAG_COPY_THRESHOLD):
+    """
+    爬虫使用：若数据库中已有高度相似且已成功分类的公告，返回 (一级TAG, 二级TAGs)，否则返回 None。
+    """
+    cursor = conn.cursor()
+    for link, _ in find_similar(cursor, title_signature(title), threshold, limit=5):
+        row = cursor.execute(
+            f"SELECT tag_primary, tags_secondary_json FROM {TABLE_NAME} WHERE link = ?", (link,)
+        ).fetchone()
+        if row and row[0] not in UNCLASSIFIED_TAGS:
+            return row[0], json.loads(row[1])
+    return None
+
+
+# ====================================================================
+# 性能基准：python similarity.py [标题数量]
+# ====================================================================
+
+def _synthetic_titles(count, seed=42):
+    """生成带有重复发布、置顶与年份变化特征的合成标题"""
+    rng = random.Random(seed)
+    common_chars = [chr(code) for code in range(0x4e00, 0x4e00 + 3000)]
+    prefixes = ["关于", "关于举办", "关于开展", "关于公布", "关于做好"]
+    suffixes = ["的通知", "的公示", "的补充通知", "的预告", "工作的通知"]
+
+    titles = []
+    base_titles = []
+    for i in range(count):
+        if base_titles and rng.random() < 0.2:
+            # 约 20% 为已有标题的置顶/补充/换年份副本
+            base = rng.choice(base_titles)
+            variant = rng.choice(["[置顶]" + base, base.replace("的通知", "的补充通知"), base.replace("2025", "2026")])
+            titles.append(variant)
+            continue
+        topic = "".join(rng.choice(common_chars) for _ in range(rng.randint(8, 24)))
+        title = f"{rng.choice(prefixes)}{rng.choice(['2024', '2025'])}年{topic}{rng.choice(suffixes)}"
+        titles.append(title)
+        if len(base_titles) < 50000:
+            base_titles.append(title)
+    return titles
+
+
+def run_benchmark(count=1000000, queries=1000):
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(f"""
+    CREATE TABLE {TABLE_NAME} (link TEXT PRIMARY KEY, title TEXT NOT NULL, timestamp INTEGER, dup_of TEXT);
+    """ + CREATE_SIMILARITY_TABLES_SQL)
+    titles = _synthetic_titles(count)
+    rows = [(f"bench://{i}", title) for i, title in enumerate(titles)]
+
+    cursor = conn.cursor()
+    start = time.perf_counter()
+    for i in range(0, len(rows), 50000):
+        index_titles(cursor, rows[i:i + 50000], replace=False)
+    conn.commit()
+    build_seconds = time.perf_counter() - start
+
+    rng = random.Random(7)
+    latencies = []
+    total_hits = 0
+    for link, title in rng.sample(rows, min(queries, len(rows))):
+        start = time.perf_counter()
+        hits = find_similar(cursor, title_signature(title), RELATED_THRESHOLD, limit=10, exclude_link=link)
+        latencies.append(time.perf_counter() - start)
+        total_hits += len(hits)
+    latencies.sort()
+
+    print(f"标题数量: {count}")
+    print(f"索引构建耗时: {build_seconds:.1f} 秒 ({count / build_seconds:.0f} 条/秒)")
+    print(f"查询延迟: p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.2f} ms, "
+          f"max {latencies[-1] * 1000:.2f} ms (平均命中 {total_hits / len(latencies):.2f} 条)")
+    conn.close()
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
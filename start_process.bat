@@ -5,9 +5,7 @@ setlocal
 set PYTHON_EXE="C:\Users\wangz\AppData\Local\Programs\Python\Python313\python.exe" 
 set PS_DIALOG_SCRIPT="D:\Project\jlu-xoa-project\confirm_dialog.ps1"
 set DR_EXE="D:\Program Files (x86)\Drcom\DrUpdateClient\DrMain.exe"
-set SCRIPT_1="D:\Project\jlu-xoa-project\get_data_from_oa.py"
-set SCRIPT_2="D:\Project\jlu-xoa-project\update_db.py"
-set SCRIPT_3="D:\Project\jlu-xoa-project\app.py"
+set SCRIPT_DAEMON="D:\Project\jlu-xoa-project\daemon.py"
 set TARGET_HTML="http://127.0.0.1:5000/oa"
 set SCRIPT_FOLDER="D:\Project\jlu-xoa-project\"
 
@@ -37,16 +35,9 @@ goto CANCEL_TASKS
     :: Forced CD to fix relative paths
     cd /d %SCRIPT_FOLDER%
 
-    :: Step 4: Execute blocking scripts (Data Fetch and DB Update)
-    
-    echo Running script 1 (Data Fetch)...
-    call %PYTHON_EXE% %SCRIPT_1%
-    
-    echo Running script 2 (DB Update)...
-    call %PYTHON_EXE% %SCRIPT_2%
-    
-    echo Starting script 3 (Server)...
-    start "Python Server" %PYTHON_EXE% %SCRIPT_3%
+    :: Step 4: Start the scheduler daemon (crawl + DB update + API server in one process)
+    echo Starting scheduler daemon...
+    start "JLU OA Daemon" %PYTHON_EXE% %SCRIPT_DAEMON%
     
 
     echo Giving server 2 seconds to initialize...
@@ -0,0 +1,287 @@
+import json
+import random
+import sqlite3
+import sys
+import time
+
+# --- 数据库配置 ---
+# 订阅由 API 写入，而公告库在快照发布模式下是只读的，因此订阅与匹配结果单独存放。
+SUBSCRIPTION_DB_NAME = 'jlu_oa_subscriptions.db'
+SUBSCRIPTION_TABLE_NAME = 'subscriptions'
+TERM_TABLE_NAME = 'subscription_terms'      # 反向索引：词项 -> 订阅
+MATCH_TABLE_NAME = 'subscription_matches'   # 每个订阅命中的公告
+
+CREATE_SUBSCRIPTION_TABLES_SQL = f"""
+CREATE TABLE IF NOT EXISTS {SUBSCRIPTION_TABLE_NAME} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT,
+    unit TEXT,
+    tags_json TEXT NOT NULL DEFAULT '[]',
+    keyword TEXT,
+    created_time INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS {TERM_TABLE_NAME} (
+    term TEXT NOT NULL,
+    subscription_id INTEGER NOT NULL,
+    PRIMARY KEY (term, subscription_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS {MATCH_TABLE_NAME} (
+    subscription_id INTEGER NOT NULL,
+    link TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    matched_time INTEGER NOT NULL,
+    PRIMARY KEY (subscription_id, link)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_{MATCH_TABLE_NAME}_generation ON {MATCH_TABLE_NAME} (subscription_id, generation);
+"""
+
+
+def get_subscription_connection(path=SUBSCRIPTION_DB_NAME, factory=sqlite3.Connection):
+    """建立订阅数据库连接并确保表结构存在 (factory 用于 API 的查询分析)"""
+    conn = sqlite3.connect(path, factory=factory)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(CREATE_SUBSCRIPTION_TABLES_SQL)
+    return conn
+
+
+# ====================================================================
+# 词项：订阅只登记一个必要条件 (锚点)，公告展开为全部可能命中的词项
+# ====================================================================
+
+def anchor_term(unit, tags, keyword):
+    """
+    选择订阅的锚点词项。订阅的所有条件都是 AND 关系，任何一个条件都是必要条件，
+    因此只需把订阅登记在最有区分度的一个条件下：单位 > TAG > 关键词中的一个双字。
+    订阅至少包含一个条件 (由 create_subscription 校验)。
+    """
+    if unit:
+        return f"u:{unit}"
+    if tags:
+        return f"t:{sorted(tags)[0]}"
+    if keyword:
+        keyword = keyword.lower()
+        return f"k:{keyword[:2]}" if len(keyword) >= 2 else f"c:{keyword}"
+    raise ValueError("订阅至少需要 unit、tags、keyword 中的一个条件")
+
+
+def announcement_terms(announcement):
+    """展开公告可能命中的全部词项：单位、一级/二级 TAG、标题与单位中的单字与双字"""
+    terms = {f"u:{announcement['unit']}", f"t:{announcement['tag_primary']}"}
+    terms.update(f"t:{tag}" for tag in announcement['tags_secondary'])
+    for text in (announcement['title'].lower(), announcement['unit'].lower()):
+        terms.update(f"c:{char}" for char in text)
+        terms.update(f"k:{text[i:i + 2]}" for i in range(len(text) - 1))
+    return terms
+
+
+def subscription_matches(subscription, announcement):
+    """完整校验订阅条件，语义与 /api/announcements 的筛选一致"""
+    if subscription['unit'] and subscription['unit'] != announcement['unit']:
+        return False
+
+    announcement_tags = {announcement['tag_primary'], *announcement['tags_secondary']}
+    if any(tag not in announcement_tags for tag in subscription['tags']):
+        return False
+
+    keyword = subscription['keyword']
+    if keyword:
+        keyword = keyword.lower()
+        if keyword not in announcement['title'].lower() and keyword not in announcement['unit'].lower():
+            return False
+
+    return True
+
+
+# ====================================================================
+# 订阅管理
+# ====================================================================
+
+def _normalize_tags(tags):
+    if tags is None:
+        return []
+    if isinstance(tags, str):
+        tags = tags.split(',')
+    elif not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+        raise ValueError("tags 应为逗号分隔的字符串或字符串列表")
+    return sorted({tag.strip() for tag in tags if tag.strip()})
+
+
+def _normalize_text(value, field):
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"{field} 应为字符串")
+    return value.strip() or None
+
+
+def create_subscription(conn, name=None, unit=None, tags=None, keyword=None):
+    """创建订阅并登记锚点词项，返回订阅 id；条件为空或类型不正确时抛出 ValueError"""
+    name = _normalize_text(name, "name")
+    unit = _normalize_text(unit, "unit")
+    tags = _normalize_tags(tags)
+    keyword = _normalize_text(keyword, "keyword")
+    if not unit and not tags and not keyword:
+        raise ValueError("订阅至少需要 unit、tags、keyword 中的一个条件")
+
+    cursor = conn.cursor()
+    cursor.execute(
+        f"INSERT INTO {SUBSCRIPTION_TABLE_NAME} (name, unit, tags_json, keyword, created_time) VALUES (?, ?, ?, ?, ?)",
+        (name, unit, json.dumps(tags, ensure_ascii=False), keyword, int(time.time()))
+    )
+    subscription_id = cursor.lastrowid
+    cursor.execute(
+        f"INSERT INTO {TERM_TABLE_NAME} (term, subscription_id) VALUES (?, ?)",
+        (anchor_term(unit, tags, keyword), subscription_id)
+    )
+    conn.commit()
+    return subscription_id
+
+
+def delete_subscription(conn, subscription_id):
+    """删除订阅及其词项与匹配结果，订阅不存在时返回 False"""
+    cursor = conn.cursor()
+    cursor.execute(f"DELETE FROM {SUBSCRIPTION_TABLE_NAME} WHERE id = ?", (subscription_id,))
+    if not cursor.rowcount:
+        return False
+    cursor.execute(f"DELETE FROM {TERM_TABLE_NAME} WHERE subscription_id = ?", (subscription_id,))
+    cursor.execute(f"DELETE FROM {MATCH_TABLE_NAME} WHERE subscription_id = ?", (subscription_id,))
+    conn.commit()
+    return True
+
+
+def serialize_subscription(row):
+    return {
+        "id": row['id'],
+        "name": row['name'],
+        "unit": row['unit'],
+        "tags": json.loads(row['tags_json']),
+        "keyword": row['keyword'],
+        "created_time": row['created_time']
+    }
+
+
+# ====================================================================
+# 导入时匹配
+# ====================================================================
+
+def _chunks(items, size=500):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def match_announcements(conn, announcements, generation):
+    """
+    将一批新导入的公告与全部订阅匹配，并写入匹配结果。
+    通过反向索引只取出锚点命中的候选订阅再逐一校验，耗时与新公告数量成正比，与订阅总数基本无关。
+    返回新增的匹配条数。
+    """
+    if not announcements:
+        return 0
+
+    cursor = conn.cursor()
+
+    # 1. 展开公告词项，并一次性查出这些词项下登记的订阅
+    terms_by_announcement = [announcement_terms(announcement) for announcement in announcements]
+    all_terms = set().union(*terms_by_announcement)
+    subscriptions_by_term = {}
+    for chunk in _chunks(all_terms):
+        placeholders = ",".join("?" * len(chunk))
+        for term, subscription_id in cursor.execute(
+            f"SELECT term, subscription_id FROM {TERM_TABLE_NAME} WHERE term IN ({placeholders})", chunk
+        ):
+            subscriptions_by_term.setdefault(term, []).append(subscription_id)
+
+    # 2. 读取候选订阅的完整条件
+    candidate_ids = {sid for ids in subscriptions_by_term.values() for sid in ids}
+    subscriptions = {}
+    for chunk in _chunks(candidate_ids):
+        placeholders = ",".join("?" * len(chunk))
+        for row in cursor.execute(
+            f"SELECT id, unit, tags_json, keyword FROM {SUBSCRIPTION_TABLE_NAME} WHERE id IN ({placeholders})", chunk
+        ):
+            subscriptions[row[0]] = {"unit": row[1], "tags": json.loads(row[2]), "keyword": row[3]}
+
+    # 3. 逐条校验候选订阅
+    matched_time = int(time.time())
+    match_records = []
+    for announcement, terms in zip(announcements, terms_by_announcement):
+        candidates = set()
+        for term in terms:
+            candidates.update(subscriptions_by_term.get(term, ()))
+        for subscription_id in candidates:
+            subscription = subscriptions.get(subscription_id)
+            if subscription and subscription_matches(subscription, announcement):
+                match_records.append((subscription_id, announcement['link'], generation, matched_time))
+
+    before_changes = conn.total_changes
+    cursor.executemany(
+        f"INSERT OR IGNORE INTO {MATCH_TABLE_NAME} (subscription_id, link, generation, matched_time) VALUES (?, ?, ?, ?)",
+        match_records
+    )
+    conn.commit()
+    return conn.total_changes - before_changes
+
+
+# ====================================================================
+# 性能基准：python subscriptions.py [订阅数量]
+# ====================================================================
+
+def run_benchmark(subscription_count=100000, batch_size=1000, seed=42):
+    rng = random.Random(seed)
+    common_chars = [chr(code) for code in range(0x4e00, 0x4e00 + 3000)]
+    units = [f"单位{i}" for i in range(80)]
+    tags = [f"标签{i}" for i in range(400)]
+    primary_tags = ["竞赛/奖学金", "学校公共设施运营", "学校公共考试与缴费", "讲座/社团活动/学校活动/项目", "科研信息", "其它信息"]
+
+    def random_text(low, high):
+        return "".join(rng.choice(common_chars) for _ in range(rng.randint(low, high)))
+
+    conn = get_subscription_connection(":memory:")
+    start = time.perf_counter()
+    for _ in range(subscription_count):
+        kind = rng.random()
+        create_args = {}
+        if kind < 0.4:
+            create_args["unit"] = rng.choice(units)
+        if 0.3 < kind < 0.8:
+            create_args["tags"] = rng.sample(tags, rng.randint(1, 3))
+        if kind > 0.7:
+            create_args["keyword"] = random_text(2, 4)
+        create_subscription(conn, **create_args)
+    setup_seconds = time.perf_counter() - start
+
+    announcements = [{
+        "link": f"bench://{i}",
+        "title": f"关于{random_text(10, 30)}的通知",
+        "unit": rng.choice(units),
+        "tag_primary": rng.choice(primary_tags),
+        "tags_secondary": rng.sample(tags, 3)
+    } for i in range(batch_size)]
+
+    start = time.perf_counter()
+    matched = match_announcements(conn, announcements, generation=1)
+    match_seconds = time.perf_counter() - start
+
+    # 对照组：不使用反向索引，逐条公告扫描全部订阅
+    all_subscriptions = [
+        {"unit": row[0], "tags": json.loads(row[1]), "keyword": row[2]}
+        for row in conn.execute(f"SELECT unit, tags_json, keyword FROM {SUBSCRIPTION_TABLE_NAME}")
+    ]
+    sample = announcements[:50]
+    start = time.perf_counter()
+    for announcement in sample:
+        for subscription in all_subscriptions:
+            subscription_matches(subscription, announcement)
+    scan_seconds = (time.perf_counter() - start) / len(sample) * batch_size
+
+    print(f"订阅数量: {subscription_count} (登记耗时 {setup_seconds:.1f} 秒)")
+    print(f"反向索引匹配 {batch_size} 条新公告: {match_seconds * 1000:.1f} ms "
+          f"(每条 {match_seconds / batch_size * 1000:.3f} ms)，产生 {matched} 条匹配 "
+          f"(平均每条 {matched / batch_size:.1f} 个订阅命中)")
+    print(f"全量扫描对照 (按 {len(sample)} 条外推): {scan_seconds * 1000:.1f} ms")
+    conn.close()
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -2,11 +2,28 @@ import sqlite3
 import json
 import time
 import os
+import sys
+from datetime import datetime, timedelta
+
+import similarity
+import subscriptions
 
 # --- 配置文件 ---
 DATABASE_NAME = 'jlu_oa_announcements.db'
 JSON_FILE_PATH = 'jlu_oa_data.json' # 请确保此路径正确
 TABLE_NAME = 'announcements'
+META_TABLE_NAME = 'sync_meta'              # 同步元信息 (当前代数 generation)
+DELETED_TABLE_NAME = 'announcements_deleted' # 已删除公告的墓碑记录，供增量同步使用
+ROLLUP_UNIT_TABLE_NAME = 'rollup_day_unit'   # 每日各发布单位公告数
+ROLLUP_TAG_TABLE_NAME = 'rollup_day_tag'     # 每日各一级 TAG 公告数
+
+# --- 快照发布配置 ---
+# 发布模式下每次导入都生成一个新的数据库文件，校验通过后原子切换 CURRENT 指针，
+# app.py 在打开新连接时读取指针，读者始终面对一个不再被修改的快照。
+SNAPSHOT_DIR = 'snapshots'
+SNAPSHOT_POINTER_FILE = os.path.join(SNAPSHOT_DIR, 'CURRENT')
+SNAPSHOT_PREFIX = 'announcements-'
+SNAPSHOT_KEEP = 5  # 保留的历史快照数量，用于即时回滚
 
 # --- 1. 数据库表结构定义 ---
 # 注意：我们将 '二级分类TAG' 存储为 JSON 字符串，方便查询和存储
@@ -21,15 +38,90 @@ CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
     tags_secondary_json TEXT,       
     link TEXT NOT NULL,            
     update_time INTEGER,            
+    update_gen INTEGER,             -- 该行最后一次变更时的代数 (generation)
+    dup_of TEXT,                    -- 存在更新的近重复公告时指向其链接 (见 similarity.py)
     
     -- 2. 约束定义 (link 保证唯一性和主键性)
     PRIMARY KEY (link) 
 );
 """
 
-def get_db_connection():
-    """建立数据库连接"""
-    conn = sqlite3.connect(DATABASE_NAME)
+# --- 增量同步相关表结构 ---
+# 每次 update_db 提交都会使代数 +1，只有内容发生变化的行才会被打上新的代数，
+# 这样 /api/announcements/changes?since=<generation> 只需按索引读取新行。
+CREATE_SYNC_TABLES_SQL = f"""
+CREATE TABLE IF NOT EXISTS {META_TABLE_NAME} (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS {DELETED_TABLE_NAME} (
+    link TEXT PRIMARY KEY,
+    deleted_gen INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_{DELETED_TABLE_NAME}_deleted_gen ON {DELETED_TABLE_NAME} (deleted_gen);
+"""
+
+# --- 按日汇总表 ---
+# 导入时只重算受影响的日期，/api/stats/trends 直接读取汇总表，无需扫描公告表。
+CREATE_ROLLUP_TABLES_SQL = f"""
+CREATE TABLE IF NOT EXISTS {ROLLUP_UNIT_TABLE_NAME} (
+    day TEXT NOT NULL,   -- YYYY-MM-DD (本地时间)
+    unit TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, unit)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS {ROLLUP_TAG_TABLE_NAME} (
+    day TEXT NOT NULL,
+    tag_primary TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, tag_primary)
+) WITHOUT ROWID;
+"""
+
+# 记录本次导入中被插入/删除/修改 (时间、单位、一级TAG) 的公告时间戳，用于确定需要重算的日期
+CREATE_ROLLUP_TRIGGERS_SQL = f"""
+CREATE TEMP TABLE IF NOT EXISTS affected_timestamps (timestamp INTEGER);
+CREATE TEMP TRIGGER IF NOT EXISTS rollup_after_insert AFTER INSERT ON {TABLE_NAME}
+BEGIN
+    INSERT INTO affected_timestamps VALUES (new.timestamp);
+END;
+CREATE TEMP TRIGGER IF NOT EXISTS rollup_after_delete AFTER DELETE ON {TABLE_NAME}
+BEGIN
+    INSERT INTO affected_timestamps VALUES (old.timestamp);
+END;
+CREATE TEMP TRIGGER IF NOT EXISTS rollup_after_update AFTER UPDATE OF timestamp, unit, tag_primary ON {TABLE_NAME}
+BEGIN
+    INSERT INTO affected_timestamps VALUES (old.timestamp), (new.timestamp);
+END;
+"""
+
+CREATE_INDEXES_SQL = f"""
+CREATE INDEX IF NOT EXISTS idx_{TABLE_NAME}_update_gen ON {TABLE_NAME} (update_gen);
+CREATE INDEX IF NOT EXISTS idx_{TABLE_NAME}_timestamp ON {TABLE_NAME} (timestamp);
+CREATE INDEX IF NOT EXISTS idx_{TABLE_NAME}_unit ON {TABLE_NAME} (unit, timestamp);
+"""
+
+def resolve_database_path():
+    """返回当前生效的数据库文件：已发布快照优先，否则为 DATABASE_NAME"""
+    try:
+        with open(SNAPSHOT_POINTER_FILE, 'r', encoding='utf-8') as f:
+            snapshot_name = f.read().strip()
+    except FileNotFoundError:
+        return DATABASE_NAME
+
+    snapshot_path = os.path.join(SNAPSHOT_DIR, snapshot_name)
+    if snapshot_name and os.path.exists(snapshot_path):
+        return snapshot_path
+    print(f"⚠️ 快照指针指向的文件不存在：{snapshot_path}，回退到 {DATABASE_NAME}")
+    return DATABASE_NAME
+
+def snapshots_published():
+    """是否已启用快照发布 (CURRENT 指针存在)。此后读者读取的是已发布快照，不能再原地写入"""
+    return os.path.exists(SNAPSHOT_POINTER_FILE)
+
+def get_db_connection(path=None):
+    """建立数据库连接 (默认连接当前生效的数据库)"""
+    conn = sqlite3.connect(path or resolve_database_path())
     conn.row_factory = sqlite3.Row # 允许以字典方式访问列
     return conn
 
@@ -37,8 +129,65 @@ def setup_database(conn):
     """创建表结构"""
     cursor = conn.cursor()
     cursor.execute(CREATE_TABLE_SQL)
+
+    # 兼容旧数据库：补充 update_gen 列
+    columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({TABLE_NAME})")]
+    if 'update_gen' not in columns:
+        cursor.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN update_gen INTEGER NOT NULL DEFAULT 0")
+    if 'dup_of' not in columns:
+        cursor.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN dup_of TEXT")
+
+    cursor.executescript(CREATE_SYNC_TABLES_SQL + CREATE_ROLLUP_TABLES_SQL + CREATE_INDEXES_SQL)
+
+    # 旧数据库迁移：已有数据统一归入第 1 代，保证 since=0 的增量请求能拿到全量
+    has_rows = cursor.execute(f"SELECT 1 FROM {TABLE_NAME} LIMIT 1").fetchone()
+    if has_rows and get_generation(conn) == 0:
+        cursor.execute(f"UPDATE {TABLE_NAME} SET update_gen = 1")
+        cursor.execute(f"INSERT OR REPLACE INTO {META_TABLE_NAME} (key, value) VALUES ('generation', 1)")
+
+    # 旧数据库迁移：汇总表为空时全量构建一次
+    if has_rows and not cursor.execute(f"SELECT 1 FROM {ROLLUP_UNIT_TABLE_NAME} LIMIT 1").fetchone():
+        rebuild_rollups(cursor)
     conn.commit()
-    print(f"数据库 {DATABASE_NAME} 表 {TABLE_NAME} 准备就绪。")
+
+    # 标题相似度索引 (旧数据库首次运行时全量构建)
+    similarity.setup_similarity_tables(conn)
+    print(f"数据库表 {TABLE_NAME} 准备就绪。")
+
+def day_from_timestamp(timestamp):
+    """将时间戳转换为本地日期 YYYY-MM-DD (与 app.py 的 date_from_timestamp 一致)"""
+    return time.strftime("%Y-%m-%d", time.localtime(timestamp))
+
+def day_range(day):
+    """返回本地日期 day 对应的 [开始时间戳, 结束时间戳)"""
+    start = datetime.strptime(day, "%Y-%m-%d")
+    end = start + timedelta(days=1)
+    return int(time.mktime(start.timetuple())), int(time.mktime(end.timetuple()))
+
+def rebuild_rollups(cursor):
+    """全量重建按日汇总表"""
+    cursor.execute(f"DELETE FROM {ROLLUP_UNIT_TABLE_NAME}")
+    cursor.execute(f"DELETE FROM {ROLLUP_TAG_TABLE_NAME}")
+    days = {day_from_timestamp(row[0]) for row in cursor.execute(f"SELECT DISTINCT timestamp FROM {TABLE_NAME}")}
+    refresh_rollups(cursor, days)
+    print(f"按日汇总表重建完成，共 {len(days)} 天。")
+
+def refresh_rollups(cursor, days):
+    """只重算指定日期的汇总行 (借助 timestamp 索引做范围查询)"""
+    for day in sorted(days):
+        start, end = day_range(day)
+        cursor.execute(f"DELETE FROM {ROLLUP_UNIT_TABLE_NAME} WHERE day = ?", (day,))
+        cursor.execute(f"DELETE FROM {ROLLUP_TAG_TABLE_NAME} WHERE day = ?", (day,))
+        cursor.execute(f"""
+        INSERT INTO {ROLLUP_UNIT_TABLE_NAME} (day, unit, count)
+        SELECT ?, unit, COUNT(*) FROM {TABLE_NAME}
+        WHERE timestamp >= ? AND timestamp < ? GROUP BY unit
+        """, (day, start, end))
+        cursor.execute(f"""
+        INSERT INTO {ROLLUP_TAG_TABLE_NAME} (day, tag_primary, count)
+        SELECT ?, tag_primary, COUNT(*) FROM {TABLE_NAME}
+        WHERE timestamp >= ? AND timestamp < ? GROUP BY tag_primary
+        """, (day, start, end))
 
 def load_json_data(file_path):
     """从 JSON 文件加载数据"""
@@ -56,68 +205,362 @@ def load_json_data(file_path):
         print(f"加载 JSON 文件时发生未知错误: {e}")
         return None
 
-def update_announcements(conn, json_data):
-    """清空旧数据并插入新数据（全量更新模式）"""
+def get_generation(conn):
+    """读取当前数据代数，尚未导入过数据时返回 0"""
+    row = conn.execute(f"SELECT value FROM {META_TABLE_NAME} WHERE key = 'generation'").fetchone()
+    return row[0] if row else 0
+
+def update_announcements(conn, json_data, match=True):
+    """
+    以 JSON 为全量数据源更新数据库（upsert 模式）。
+    只有新增或内容变化的行才会写入并打上新的代数，JSON 中已不存在的行会被删除并记录墓碑。
+    match=True 时提交后立即匹配订阅；快照发布模式传 False，切换成功后再匹配。
+    返回本次更新的统计信息字典，失败或无数据时返回 None。
+    """
     if not json_data:
         print("无数据或数据加载失败，跳过数据库更新。")
-        return
+        return None
 
     cursor = conn.cursor()
+
+    # 通过临时触发器记录受影响的日期，供增量更新汇总表 (executescript 会先提交，须在事务开始前执行)
+    cursor.executescript(CREATE_ROLLUP_TRIGGERS_SQL)
     
     # --- 开始事务 ---
     conn.execute("BEGIN TRANSACTION")
     try:
-        # 1. 清空现有数据 (全量更新)
-        cursor.execute(f"DELETE FROM {TABLE_NAME}")
-        print("已清空旧数据。")
-
-        # 2. 准备批量插入的数据
-        records_to_insert = []
+        generation = get_generation(conn) + 1
         current_time = int(time.time())
-        
+
+        # 1. 准备批量写入的数据
+        records_to_upsert = []
         for item in json_data:
             # 将二级 TAG 列表转换为 JSON 字符串以便存储
             tags_secondary_str = json.dumps(item.get("二级分类TAG", []), ensure_ascii=False)
             
-            records_to_insert.append((
+            records_to_upsert.append((
                 item["新闻发布时间戳"],
                 item["新闻标题"],
                 item["发布单位"],
                 item["一级分类TAG"],
                 tags_secondary_str,
                 item["链接"],
-                current_time
+                current_time,
+                generation
             ))
 
-        # 3. 批量插入新数据
-        insert_sql = f"""
-        INSERT INTO {TABLE_NAME} VALUES (?, ?, ?, ?, ?, ?, ?)
+        # 2. 删除 JSON 中已不存在的旧数据，并记录墓碑
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS incoming_links (link TEXT PRIMARY KEY)")
+        cursor.execute("DELETE FROM incoming_links")
+        cursor.executemany("INSERT OR IGNORE INTO incoming_links VALUES (?)", [(r[5],) for r in records_to_upsert])
+        # JSON 中重复的链接会被 upsert 合并，导入后的行数以去重后的链接数为准
+        total_count = cursor.execute("SELECT COUNT(*) FROM incoming_links").fetchone()[0]
+        deleted_links = [row[0] for row in cursor.execute(
+            f"SELECT link FROM {TABLE_NAME} WHERE link NOT IN (SELECT link FROM incoming_links)"
+        )]
+        cursor.execute(f"""
+        INSERT OR REPLACE INTO {DELETED_TABLE_NAME} (link, deleted_gen)
+        SELECT link, ? FROM {TABLE_NAME} WHERE link NOT IN (SELECT link FROM incoming_links)
+        """, (generation,))
+        deleted_count = cursor.rowcount
+        cursor.execute(f"DELETE FROM {TABLE_NAME} WHERE link NOT IN (SELECT link FROM incoming_links)")
+
+        # 3. 批量 upsert：内容未变化的行保持原有代数不动
+        upsert_sql = f"""
+        INSERT INTO {TABLE_NAME} (timestamp, title, unit, tag_primary, tags_secondary_json, link, update_time, update_gen)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (link) DO UPDATE SET
+            timestamp = excluded.timestamp,
+            title = excluded.title,
+            unit = excluded.unit,
+            tag_primary = excluded.tag_primary,
+            tags_secondary_json = excluded.tags_secondary_json,
+            update_time = excluded.update_time,
+            update_gen = excluded.update_gen
+        WHERE timestamp IS NOT excluded.timestamp
+           OR title IS NOT excluded.title
+           OR unit IS NOT excluded.unit
+           OR tag_primary IS NOT excluded.tag_primary
+           OR tags_secondary_json IS NOT excluded.tags_secondary_json
         """
-        cursor.executemany(insert_sql, records_to_insert)
+        cursor.executemany(upsert_sql, records_to_upsert)
+
+        # 重新出现的链接不再视为已删除
+        cursor.execute(f"DELETE FROM {DELETED_TABLE_NAME} WHERE link IN (SELECT link FROM incoming_links)")
+
+        # 4. 只针对变化的行维护标题相似度索引与近重复标记
+        changed_links = [row[0] for row in cursor.execute(
+            f"SELECT link FROM {TABLE_NAME} WHERE update_gen = ?", (generation,)
+        )]
+        changed_count = len(changed_links)
+        similarity.sync_similarity_index(cursor, changed_links, deleted_links)
+
+        # 5. 只重算受影响日期的汇总行
+        affected_days = {day_from_timestamp(row[0]) for row in cursor.execute("SELECT DISTINCT timestamp FROM affected_timestamps")}
+        refresh_rollups(cursor, affected_days)
+        cursor.execute("DELETE FROM affected_timestamps")
+
+        # 6. 只有确实发生变化时才推进代数，避免订阅端收到空推送
+        if changed_count or deleted_count:
+            cursor.execute(
+                f"INSERT OR REPLACE INTO {META_TABLE_NAME} (key, value) VALUES ('generation', ?)",
+                (generation,)
+            )
+        else:
+            generation -= 1
 
-        # 4. 提交事务
+        # 7. 提交事务
         conn.commit()
-        print(f"成功导入 {len(records_to_insert)} 条新公告。")
+        print(f"共 {total_count} 条公告，新增/更新 {changed_count} 条，删除 {deleted_count} 条，当前代数 {generation}。")
+
+        # 8. 将本批新增/变化的公告与已保存的订阅匹配
+        matched_count = match_subscriptions(conn, generation) if match and changed_count else 0
+
+        return {
+            "generation": generation,
+            "total": total_count,
+            "changed": changed_count,
+            "deleted": deleted_count,
+            "matched": matched_count
+        }
         
     except sqlite3.Error as e:
         conn.rollback()
         print(f"数据库操作失败，已回滚事务: {e}")
+        return None
     finally:
         cursor.close()
 
-def main():
-    """主执行函数"""
+def match_subscriptions(conn, generation):
+    """
+    把指定代数新增/变化的公告交给订阅反向索引匹配，失败不影响本次导入，返回新增匹配数。
+    只能在该代数已提交 (原地模式) 或已发布 (快照模式) 之后调用，避免记录从未生效的代数。
+    """
+    rows = conn.execute(
+        f"SELECT timestamp, title, unit, tag_primary, tags_secondary_json, link FROM {TABLE_NAME} WHERE update_gen = ?",
+        (generation,)
+    ).fetchall()
+    announcements = [{
+        "timestamp": row[0],
+        "title": row[1],
+        "unit": row[2],
+        "tag_primary": row[3],
+        "tags_secondary": json.loads(row[4]),
+        "link": row[5]
+    } for row in rows]
+
+    try:
+        sub_conn = subscriptions.get_subscription_connection()
+        try:
+            matched_count = subscriptions.match_announcements(sub_conn, announcements, generation)
+        finally:
+            sub_conn.close()
+    except sqlite3.Error as e:
+        print(f"⚠️ 订阅匹配失败: {e}")
+        return 0
+
+    if matched_count:
+        print(f"🔔 新增 {matched_count} 条订阅匹配。")
+    return matched_count
+
+# ====================================================================
+# 快照发布：离线构建 -> 校验 -> 原子切换
+# ====================================================================
+
+def list_snapshots():
+    """按代数从旧到新列出快照文件名"""
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return []
+    names = [
+        name for name in os.listdir(SNAPSHOT_DIR)
+        if name.startswith(SNAPSHOT_PREFIX) and name.endswith('.db')
+    ]
+    return sorted(names)
+
+def snapshot_generation(snapshot_name):
+    """从快照文件名 announcements-<代数>-<时间戳>.db 中解析代数"""
+    try:
+        return int(snapshot_name[len(SNAPSHOT_PREFIX):].split('-')[0])
+    except ValueError:
+        return 0
+
+def switch_snapshot(snapshot_name):
+    """原子地把 CURRENT 指针切换到指定快照 (先写临时文件再 os.replace)"""
+    tmp_pointer = SNAPSHOT_POINTER_FILE + '.tmp'
+    with open(tmp_pointer, 'w', encoding='utf-8') as f:
+        f.write(snapshot_name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_pointer, SNAPSHOT_POINTER_FILE)
+    print(f"🔀 已切换到快照 {snapshot_name}。")
+
+def validate_snapshot(conn, expected_total):
+    """校验新快照：完整性检查、行数与必需索引"""
+    integrity = conn.execute("PRAGMA integrity_check").fetchone()[0]
+    if integrity != 'ok':
+        print(f"❌ 快照完整性检查失败: {integrity}")
+        return False
+
+    total = conn.execute(f"SELECT COUNT(*) FROM {TABLE_NAME}").fetchone()[0]
+    if total != expected_total:
+        print(f"❌ 快照行数 {total} 与导入数据 {expected_total} 不一致。")
+        return False
+
+    indexed_titles = conn.execute(f"SELECT COUNT(*) FROM {similarity.SIGNATURE_TABLE_NAME}").fetchone()[0]
+    if indexed_titles != total:
+        print(f"❌ 相似度索引 {indexed_titles} 条与公告 {total} 条不一致。")
+        return False
+
+    rollup_total = conn.execute(f"SELECT COALESCE(SUM(count), 0) FROM {ROLLUP_UNIT_TABLE_NAME}").fetchone()[0]
+    if rollup_total != total:
+        print(f"❌ 按日汇总合计 {rollup_total} 与公告 {total} 条不一致。")
+        return False
+
+    index_names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    required_indexes = {f"idx_{TABLE_NAME}_update_gen", f"idx_{TABLE_NAME}_timestamp", f"idx_{TABLE_NAME}_unit"}
+    missing = required_indexes - index_names
+    if missing:
+        print(f"❌ 快照缺少索引: {', '.join(sorted(missing))}")
+        return False
+
+    return True
+
+def prune_snapshots(keep=SNAPSHOT_KEEP):
+    """删除超出保留数量的旧快照 (当前快照永不删除)"""
+    snapshots = list_snapshots()
+    current = os.path.basename(resolve_database_path())
+    for name in snapshots[:-keep]:
+        if name == current:
+            continue
+        try:
+            os.remove(os.path.join(SNAPSHOT_DIR, name))
+        except OSError as e:
+            # Windows 下仍被读者打开的文件无法删除，留待下次清理
+            print(f"⚠️ 暂时无法删除旧快照 {name}: {e}")
+
+def publish_snapshot(json_data):
+    """
+    发布模式：复制当前数据到新文件，在副本上完成导入、建索引与校验，
+    通过后原子切换 CURRENT 指针。读者全程只读旧快照，不会被导入事务阻塞；
+    导入或校验失败时指针保持不变。返回统计信息字典，失败时返回 None。
+    """
+    if not json_data:
+        print("无数据或数据加载失败，跳过快照发布。")
+        return None
+
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    source_path = resolve_database_path()
+    building_path = os.path.join(SNAPSHOT_DIR, f"building-{os.getpid()}.db")
+    if os.path.exists(building_path):
+        os.remove(building_path)
+
+    # 1. 复制当前数据 (保留代数与删除记录，保证增量同步连续)
+    conn = get_db_connection(building_path)
+    if os.path.exists(source_path):
+        source_conn = sqlite3.connect(source_path)
+        source_conn.backup(conn)
+        source_conn.close()
+
+    stats = None
+    publish_ready = False
+    try:
+        setup_database(conn)
+        live_generation = get_generation(conn)
+
+        # 回滚后再发布时，代数需越过所有已存在的快照，避免客户端看到重复的代数
+        latest_known = max([snapshot_generation(name) for name in list_snapshots()] + [get_generation(conn)])
+        conn.execute(f"INSERT OR REPLACE INTO {META_TABLE_NAME} (key, value) VALUES ('generation', ?)", (latest_known,))
+        conn.commit()
+
+        # 2. 在副本上导入
+        stats = update_announcements(conn, json_data, match=False)
+        if stats is None:
+            print("❌ 快照导入失败，保持当前快照不变。")
+        elif not stats["changed"] and not stats["deleted"] and source_path != DATABASE_NAME:
+            # 副本的代数已被抬高但不会发布，对外报告仍在服务的快照代数
+            print("ℹ️ 数据无变化，保留当前快照。")
+            stats["generation"] = live_generation
+        # 3. 校验并更新查询优化统计
+        elif validate_snapshot(conn, stats["total"]):
+            conn.execute("ANALYZE")
+            conn.commit()
+            publish_ready = True
+        else:
+            print("❌ 快照校验失败，保持当前快照不变。")
+            stats = None
+    finally:
+        conn.close()
+        if not publish_ready and os.path.exists(building_path):
+            os.remove(building_path)
+
+    if not publish_ready:
+        return stats
+
+    # 4. 原子切换
+    snapshot_name = f"{SNAPSHOT_PREFIX}{stats['generation']:08d}-{int(time.time())}.db"
+    snapshot_path = os.path.join(SNAPSHOT_DIR, snapshot_name)
+    os.replace(building_path, snapshot_path)
+    switch_snapshot(snapshot_name)
+    prune_snapshots()
+
+    # 5. 新快照生效后再匹配订阅
+    if stats["changed"]:
+        conn = get_db_connection(snapshot_path)
+        try:
+            stats["matched"] = match_subscriptions(conn, stats["generation"])
+        finally:
+            conn.close()
+    return stats
+
+def rollback_snapshot():
+    """回滚到上一个保留的快照，返回切换后的快照名，无可回滚快照时返回 None"""
+    snapshots = list_snapshots()
+    current = os.path.basename(resolve_database_path())
+    if current not in snapshots:
+        print("⚠️ 当前未使用快照发布，无法回滚。")
+        return None
+
+    index = snapshots.index(current)
+    if index == 0:
+        print("⚠️ 没有更早的快照可供回滚。")
+        return None
+
+    previous = snapshots[index - 1]
+    switch_snapshot(previous)
+    return previous
+
+def main(argv=None):
+    """
+    主执行函数
+    用法: python update_db.py             原地更新当前数据库
+          python update_db.py --publish   构建并发布新快照
+          python update_db.py --rollback  回滚到上一个快照
+    """
+    argv = sys.argv[1:] if argv is None else argv
     print("--- 公告数据库更新脚本启动 ---")
-    
-    # 1. 建立数据库连接
+
+    if '--rollback' in argv:
+        rollback_snapshot()
+        print("--- 脚本执行完毕 ---")
+        return
+
+    # 1. 加载最新的 JSON 数据
+    data = load_json_data(JSON_FILE_PATH)
+
+    if '--publish' in argv or snapshots_published():
+        # 2. 快照发布模式 (已发布过快照时，原地更新会阻塞读者并改写保留的回滚目标，因此同样走发布流程)
+        if '--publish' not in argv:
+            print(f"ℹ️ 检测到 {SNAPSHOT_POINTER_FILE}，改用快照发布模式更新。")
+        publish_snapshot(data)
+        print("--- 脚本执行完毕 ---")
+        return
+
+    # 2. 建立数据库连接
     conn = get_db_connection()
     
-    # 2. 确保表结构存在
+    # 3. 确保表结构存在
     setup_database(conn)
     
-    # 3. 加载最新的 JSON 数据
-    data = load_json_data(JSON_FILE_PATH)
-    
     # 4. 更新数据库
     update_announcements(conn, data)
     